@@ -0,0 +1,229 @@
+"""
+Calculator core logic shared by the MCP server, without MCP dependencies
+"""
+import copy
+import json
+import math
+from functools import lru_cache, reduce
+from operator import sub, truediv
+from typing import Any, Callable, Dict, Sequence, Union
+
+
+def _add(args: Sequence[float]) -> Union[int, float]:
+    return sum(args)
+
+
+def _subtract(args: Sequence[float]) -> Union[int, float]:
+    if len(args) < 2:
+        raise ValueError("Subtraction requires at least 2 arguments")
+    return reduce(sub, args)
+
+
+def _multiply(args: Sequence[float]) -> Union[int, float]:
+    return math.prod(args)
+
+
+def _divide(args: Sequence[float]) -> Union[int, float]:
+    if len(args) < 2:
+        raise ValueError("Division requires at least 2 arguments")
+    if 0 in args[1:]:
+        raise ValueError("Cannot divide by zero")
+    return reduce(truediv, args)
+
+
+def _power(args: Sequence[float]) -> Union[int, float]:
+    if len(args) != 2:
+        raise ValueError("Power operation requires exactly 2 arguments")
+    # float ** float is typed Any (a negative base can give a complex result)
+    result: Union[int, float] = args[0] ** args[1]
+    return result
+
+
+def _modulo(args: Sequence[float]) -> Union[int, float]:
+    if len(args) != 2:
+        raise ValueError("Modulo operation requires exactly 2 arguments")
+    if args[1] == 0:
+        raise ValueError("Cannot modulo by zero")
+    return args[0] % args[1]
+
+
+# Method name -> handler; each handler validates its own argument count
+_HANDLERS: Dict[str, Callable[[Sequence[float]], Union[int, float]]] = {
+    "add": _add,
+    "subtract": _subtract,
+    "multiply": _multiply,
+    "divide": _divide,
+    "power": _power,
+    "modulo": _modulo,
+}
+
+
+def _calculate(method: str, args: Sequence[float]) -> Union[int, float]:
+    try:
+        handler = _HANDLERS[method]
+    except KeyError:
+        raise ValueError(f"Invalid method: {method}") from None
+
+    result = handler(args)
+
+    # Return integer if result is a whole number. Tool args arrive as floats,
+    # so every operation (not just divide/power/modulo) can produce one.
+    if type(result) is float and result.is_integer():
+        return int(result)
+
+    return result
+
+
+# Identical tool calls (e.g. LLM retries) are answered from this cache
+_calculate_cached = lru_cache(maxsize=1024)(_calculate)
+
+
+def calculate_operation(method: str, args: list[float]) -> Union[int, float]:
+    """
+    Core calculation logic without MCP dependencies.
+
+    Results are memoized on ``(method, args)``. Only all-float argument lists
+    are cached: NaN never compares equal, and ints would share cache slots with
+    equal floats.
+
+    Args:
+        method: The operation to perform
+        args: List of numeric arguments
+
+    Returns:
+        The calculation result
+
+    Raises:
+        ValueError: For invalid methods or arguments
+    """
+    if not all(type(arg) is float and arg == arg for arg in args):
+        return _calculate(method, args)
+
+    # Key on args in order: float add/multiply results depend on it
+    return _calculate_cached(method, tuple(args))
+
+
+OPERATIONS: list[Dict[str, Any]] = [
+    {
+        "name": "add",
+        "description": "Addition operation",
+        "min_args": 2,
+        "max_args": None,
+        "example": "calculate('add', [1, 2, 3]) → 6",
+    },
+    {
+        "name": "subtract",
+        "description": "Subtraction operation (left-to-right)",
+        "min_args": 2,
+        "max_args": None,
+        "example": "calculate('subtract', [10, 3, 2]) → 5",
+    },
+    {
+        "name": "multiply",
+        "description": "Multiplication operation",
+        "min_args": 2,
+        "max_args": None,
+        "example": "calculate('multiply', [2, 3, 4]) → 24",
+    },
+    {
+        "name": "divide",
+        "description": "Division operation (left-to-right)",
+        "min_args": 2,
+        "max_args": None,
+        "example": "calculate('divide', [100, 5, 2]) → 10",
+    },
+    {
+        "name": "power",
+        "description": "Power operation (base^exponent)",
+        "min_args": 2,
+        "max_args": 2,
+        "example": "calculate('power', [2, 3]) → 8",
+    },
+    {
+        "name": "modulo",
+        "description": "Modulo operation (a % b)",
+        "min_args": 2,
+        "max_args": 2,
+        "example": "calculate('modulo', [10, 3]) → 1",
+    },
+]
+
+CONFIG: Dict[str, Any] = {
+    "name": "CalculatorServer",
+    "version": "1.0.0",
+    "description": "MCP Calculator Server supporting basic mathematical operations",
+    "supported_operations": [op["name"] for op in OPERATIONS],
+    "features": [
+        "Integer optimization (returns int when result is whole number)",
+        "Error handling for division by zero",
+        "Support for both integer and float inputs",
+        "Argument validation for each operation",
+    ],
+    "author": "MCP Learning Project",
+    "framework": "FastMCP",
+    "python_version": ">=3.10",
+    "operations": OPERATIONS,
+}
+
+_OP_BY_NAME: Dict[str, Dict[str, Any]] = {op["name"]: op for op in OPERATIONS}
+_OP_NOT_FOUND: Dict[str, Any] = {"error": "Operation not found"}
+
+# Resource payloads are static, so they are serialized once at import
+CONFIG_JSON = json.dumps(CONFIG, indent=2, ensure_ascii=False)
+_OPERATION_JSON = {
+    name: json.dumps(op, indent=2, ensure_ascii=False) for name, op in _OP_BY_NAME.items()
+}
+_NOT_FOUND_JSON = json.dumps(_OP_NOT_FOUND, indent=2, ensure_ascii=False)
+
+
+def get_config_data() -> Dict[str, Any]:
+    """
+    Get calculator configuration data.
+
+    Returns:
+        Configuration dictionary (a copy; CONFIG_JSON is serialized from the original)
+    """
+    return copy.deepcopy(CONFIG)
+
+
+def get_operation_data(name: str) -> Dict[str, Any]:
+    """
+    Get operation data by name.
+
+    Args:
+        name: Operation name
+
+    Returns:
+        Operation data or error, as a fresh dict the caller may modify
+    """
+    return dict(_OP_BY_NAME.get(name, _OP_NOT_FOUND))
+
+
+def get_operation_json(name: str) -> str:
+    """
+    Get the pre-serialized JSON for an operation.
+
+    Args:
+        name: Operation name
+
+    Returns:
+        Operation JSON, or an error JSON if the name is unknown
+    """
+    return _OPERATION_JSON.get(name, _NOT_FOUND_JSON)
+
+
+@lru_cache(maxsize=32)
+def calculate_next_version(current_version: str) -> str:
+    """
+    Calculate the next version number.
+
+    Args:
+        current_version: Current version string (e.g., "1.0.0")
+
+    Returns:
+        Next version string (e.g., "1.1.0")
+    """
+    parts = current_version.split('.')
+    major = int(parts[0])
+    minor = int(parts[1])
+    return f"{major}.{minor + 1}.0"
@@ -3,6 +3,8 @@ from typing import Dict, List
 from fastmcp import FastMCP
 from fastmcp.prompts.prompt import PromptMessage, TextContent
 
+from prompt_flow_core import render_report
+
 mcp = FastMCP(
     name="PromptFlowServer",
     instructions="""Prompt Flow server providing various prompt templates for different use cases.
@@ -73,27 +75,7 @@ def generate_report(title: str, data: List[int]) -> str:
     Returns:
         格式化的Markdown报告模板
     """
-    data_items = "\n".join([f"- 项目 {i + 1}: {value}" for i, value in enumerate(data)])
-
-    template = f"""# {title}
-
-## 数据概览
-
-{data_items}
-
-## 统计分析
-
-- 总数量: {len(data)}
-- 最大值: {max(data) if data else "N/A"}
-- 最小值: {min(data) if data else "N/A"}
-- 平均值: {sum(data) / len(data):.2f if data else 'N/A'}
-
-## 结论
-
-请根据以上数据生成相应的分析结论和建议。
-"""
-
-    return template
+    return render_report(title, data)
 
 
 @mcp.prompt()
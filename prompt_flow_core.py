@@ -0,0 +1,50 @@
+"""
+Prompt template rendering shared by the prompt flow server, without MCP dependencies
+"""
+from typing import Dict, List, Union
+
+_REPORT_TEMPLATE = """# {title}
+
+## 数据概览
+
+{data_items}
+
+## 统计分析
+
+- 总数量: {count}
+- 最大值: {maximum}
+- 最小值: {minimum}
+- 平均值: {average}
+
+## 结论
+
+请根据以上数据生成相应的分析结论和建议。
+"""
+
+
+def render_report(title: str, data: List[int]) -> str:
+    """
+    Render the Markdown report template for a data list.
+
+    Args:
+        title: Report title
+        data: Values to list and summarize
+
+    Returns:
+        The report text; statistics read N/A when data is empty
+    """
+    data_items = "\n".join(f"- 项目 {i + 1}: {value}" for i, value in enumerate(data))
+
+    stats: Dict[str, Union[int, str]]
+    if data:
+        stats = {
+            "maximum": max(data),
+            "minimum": min(data),
+            "average": f"{sum(data) / len(data):.2f}",
+        }
+    else:
+        stats = {"maximum": "N/A", "minimum": "N/A", "average": "N/A"}
+
+    return _REPORT_TEMPLATE.format_map(
+        {"title": title, "data_items": data_items, "count": len(data), **stats}
+    )
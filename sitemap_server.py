@@ -3,15 +3,36 @@
 Sitemap MCP Server - Parse and analyze XML sitemaps using FastMCP
 """
 
+import asyncio
+import hashlib
+import heapq
 import json
 import os
-from datetime import datetime
-from functools import wraps
-from typing import Any, Dict, List
-from urllib.parse import urlparse
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+import zlib
+from collections import Counter, defaultdict, deque
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache, wraps
+from itertools import islice
+from typing import (
+    Any,
+    AsyncGenerator,
+    Callable,
+    DefaultDict,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+from urllib.parse import urlsplit
 
-import requests
-import xmltodict
+import httpx
 from fastmcp import Context, FastMCP
 
 mcp = FastMCP(
@@ -19,7 +40,7 @@ mcp = FastMCP(
     instructions="""Sitemap parser server for analyzing XML sitemaps with update tracking capabilities.
 
     Available tools:
-    - parse_sitemap: Parse sitemap XML and extract URLs
+    - parse_sitemap: Parse sitemap XML and extract URLs (recursive=True expands sitemap indexes)
     - analyze_sitemap: Get detailed statistics about a sitemap
     - validate_sitemap: Check if sitemap follows XML sitemap protocol
     - extract_domain_info: Get domain information from sitemap URLs
@@ -63,37 +84,334 @@ def require_auth_in_http_mode(func):
 
     return wrapper
 
-async def _parse_sitemap_internal(url: str, ctx: Context) -> Dict[str, Any]:
+# Shared client so repeated fetches reuse pooled keep-alive connections
+_HTTP = httpx.AsyncClient(
+    timeout=30,
+    follow_redirects=True,
+    limits=httpx.Limits(max_keepalive_connections=20),
+)
+
+# Hard cap on a sitemap body, after any gzip decoding; the protocol allows 50MB
+_MAX_SITEMAP_BYTES = 55 * 1024 * 1024
+_TOO_LARGE_MSG = f"sitemap 超过 {_MAX_SITEMAP_BYTES // (1024 * 1024)}MB 大小上限"
+
+# Child sitemaps fetched at once when expanding a sitemap index
+_INDEX_CONCURRENCY = 16
+# Children queued ahead of the one being merged, so a slow child doesn't stall
+# the other fetches while finished documents waiting behind it stay bounded
+_INDEX_LOOKAHEAD = 4 * _INDEX_CONCURRENCY
+# Bounds on one recursive expansion; past either one the result is truncated
+_MAX_INDEX_CHILDREN = 1000
+_MAX_MERGED_URLS = 500_000
+
+# Parsed sitemaps are shared across tools for this many seconds
+_CACHE_TTL = 600
+_CACHE_MAXSIZE = 128
+# Total URLs across cached documents, which bounds cache memory by content size
+_CACHE_MAX_URLS = 500_000
+
+# Documents with validators are also saved here so a restarted server can
+# revalidate them instead of downloading and parsing again; "" disables it
+_DISK_CACHE_DIR = os.getenv(
+    "SITEMAP_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "sitemap-mcp")
+)
+_DISK_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+@dataclass(frozen=True, slots=True)
+class _UrlRecord:
+    """One <url> or <sitemap> entry; slots keep large sitemaps compact in the cache"""
+    loc: str
+    lastmod: Optional[str] = None
+    # lastmod parsed once at extraction time, None when missing or unrecognised
+    lastmod_dt: Optional[datetime] = None
+    changefreq: Optional[str] = None
+    priority: Optional[str] = None
+
+@dataclass
+class _SitemapDocument:
+    """A fetched and parsed sitemap"""
+    urls: List[str]
+    url_details: List[_UrlRecord]
+    sitemap_type: str
+    content_size: int
+    fetched_at: datetime
+    # Validators for conditional revalidation once the entry expires
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+# url -> (expiry on the time.monotonic() clock, parsed document)
+_SITEMAP_CACHE: Dict[str, Tuple[float, _SitemapDocument]] = {}
+
+async def _download(
+    url: str, feed: Callable[[bytes], None], headers: Optional[Dict[str, str]] = None
+) -> Tuple[Optional[int], httpx.Headers]:
     """
-    Internal function to parse sitemap and extract URLs
+    Stream a sitemap body into feed chunk by chunk, gunzipping .xml.gz payloads
+    and refusing anything larger than _MAX_SITEMAP_BYTES
+
+    Returns the number of (uncompressed) bytes fed and the response headers.
+    The size is None when a conditional request is answered with 304 Not
+    Modified.
     """
-    try:
-        # Fetch the sitemap XML
-        await ctx.report_progress(0, 3, "正在下载 sitemap...")
-        response = requests.get(url, timeout=30)
+    size = 0
+    decompressor = None
+    # httpx negotiates gzip/deflate and decodes Content-Encoding as it streams
+    async with _HTTP.stream("GET", url, headers=headers) as response:
+        if response.status_code == 304 and headers:
+            return None, response.headers
         response.raise_for_status()
 
-        await ctx.report_progress(1, 3, "正在解析 XML...")
-        # Parse XML using xmltodict
-        parsed_data = xmltodict.parse(response.text)
+        async for chunk in response.aiter_bytes(65536):
+            if size == 0 and decompressor is None and chunk[:2] == b"\x1f\x8b":
+                # sitemap.xml.gz is served as a gzip file rather than with
+                # Content-Encoding, so it arrives still compressed
+                decompressor = zlib.decompressobj(wbits=31)
+            if decompressor is not None:
+                chunk = decompressor.decompress(chunk, _MAX_SITEMAP_BYTES - size + 1)
+
+            size += len(chunk)
+            if size > _MAX_SITEMAP_BYTES:
+                raise ValueError(_TOO_LARGE_MSG)
+            feed(chunk)
+
+        return size, response.headers
+
+def _disk_cache_path(url: str) -> str:
+    """Path of the disk cache entry for a sitemap URL"""
+    return os.path.join(_DISK_CACHE_DIR, hashlib.sha256(url.encode()).hexdigest() + ".json")
+
+def _load_disk_entry(url: str) -> Optional[_SitemapDocument]:
+    """Read a document saved by _save_disk_entry, or None if missing or unreadable"""
+    if not _DISK_CACHE_DIR:
+        return None
+    try:
+        with open(_disk_cache_path(url), encoding="utf-8") as f:
+            data = json.load(f)
+        if data["url"] != url:
+            return None
+        url_details = [
+            _UrlRecord(
+                loc=loc,
+                lastmod=lastmod,
+                lastmod_dt=_parse_lastmod(lastmod) if lastmod else None,
+                changefreq=changefreq,
+                priority=priority
+            )
+            for loc, lastmod, changefreq, priority in data["url_details"]
+        ]
+        return _SitemapDocument(
+            urls=[item.loc for item in url_details],
+            url_details=url_details,
+            sitemap_type=data["sitemap_type"],
+            content_size=data["content_size"],
+            fetched_at=datetime.fromisoformat(data["fetched_at"]),
+            etag=data["etag"],
+            last_modified=data["last_modified"],
+        )
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def _save_disk_entry(url: str, document: _SitemapDocument) -> None:
+    """
+    Save a document and its validators to the disk cache
+
+    The entry is written to a temporary file and renamed into place, so readers
+    never see a partial file. The oldest entries are then removed until the
+    directory fits in _DISK_CACHE_MAX_BYTES. Disk errors are ignored.
+    """
+    if not _DISK_CACHE_DIR:
+        return
+    data = {
+        "url": url,
+        "etag": document.etag,
+        "last_modified": document.last_modified,
+        "sitemap_type": document.sitemap_type,
+        "content_size": document.content_size,
+        "fetched_at": document.fetched_at.isoformat(),
+        "url_details": [
+            [item.loc, item.lastmod, item.changefreq, item.priority] for item in document.url_details
+        ]
+    }
+    try:
+        os.makedirs(_DISK_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=_DISK_CACHE_DIR, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, _disk_cache_path(url))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        entries = [entry for entry in os.scandir(_DISK_CACHE_DIR) if entry.name.endswith(".json")]
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            if total <= _DISK_CACHE_MAX_BYTES:
+                break
+            total -= entry.stat().st_size
+            os.unlink(entry.path)
+    except OSError:
+        pass
+
+async def _fetch_and_parse(url: str, cache_result: bool = True) -> _SitemapDocument:
+    """
+    Fetch and parse a sitemap, reusing the cached result for _CACHE_TTL seconds
+
+    The cache holds at most _CACHE_MAXSIZE documents and _CACHE_MAX_URLS URLs
+    in total, evicting the oldest entries first.
 
-        await ctx.report_progress(2, 3, "正在提取 URLs...")
-        # Extract URLs from parsed data
-        urls = _extract_urls(parsed_data)
+    An expired entry, or one a previous process left in the disk cache, is
+    revalidated with If-None-Match/If-Modified-Since, so an unchanged sitemap
+    is neither downloaded nor parsed again. With cache_result=False existing
+    entries are still used, but a newly fetched document is not stored.
+    """
+    now = time.monotonic()
+    cached = _SITEMAP_CACHE.get(url)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
+    stale = cached[1] if cached is not None else None
+    if stale is None:
+        stale = await asyncio.to_thread(_load_disk_entry, url)
+    headers = {}
+    if stale is not None:
+        if stale.etag:
+            headers["If-None-Match"] = stale.etag
+        if stale.last_modified:
+            headers["If-Modified-Since"] = stale.last_modified
+
+    # Parse while downloading so the raw body is never held in memory
+    parser = _SitemapParser()
+    content_size, response_headers = await _download(url, parser.feed, headers)
+
+    if content_size is None:
+        # _download only reports 304 when validators were sent, which needs a stale entry
+        assert stale is not None
+        document = stale
+    else:
+        sitemap_type, url_details = parser.close()
+        document = _SitemapDocument(
+            urls=[item.loc for item in url_details],
+            url_details=url_details,
+            sitemap_type=sitemap_type,
+            content_size=content_size,
+            fetched_at=datetime.now(),
+            etag=response_headers.get("ETag"),
+            last_modified=response_headers.get("Last-Modified"),
+        )
+
+    size = len(document.urls)
+    if not cache_result or size > _CACHE_MAX_URLS:
+        # An oversized document would evict everything else and still exceed the budget
+        return document
+
+    if content_size is not None and (document.etag or document.last_modified):
+        await asyncio.to_thread(_save_disk_entry, url, document)
+
+    _SITEMAP_CACHE.pop(url, None)
+    cached_urls = sum(len(entry[1].urls) for entry in _SITEMAP_CACHE.values())
+    while _SITEMAP_CACHE and (
+        len(_SITEMAP_CACHE) >= _CACHE_MAXSIZE or cached_urls + size > _CACHE_MAX_URLS
+    ):
+        # Dicts keep insertion order, so the first key is the oldest entry
+        _, evicted = _SITEMAP_CACHE.pop(next(iter(_SITEMAP_CACHE)))
+        cached_urls -= len(evicted.urls)
+    _SITEMAP_CACHE[url] = (now + _CACHE_TTL, document)
+
+    return document
+
+async def _fetch_children(child_urls: List[str]) -> AsyncGenerator[Tuple[str, Any], None]:
+    """
+    Fetch the child sitemaps of an index, keeping _INDEX_CONCURRENCY in flight
+
+    Yields (child_url, result) in index order, where result is the child's
+    _SitemapDocument or the exception it raised. Fetches are started at most
+    _INDEX_LOOKAHEAD children ahead of the caller, and closing the generator
+    cancels the ones still pending. Children are not stored in the shared cache.
+    """
+    semaphore = asyncio.Semaphore(_INDEX_CONCURRENCY)
+
+    async def fetch(child_url: str) -> _SitemapDocument:
+        async with semaphore:
+            return await _fetch_and_parse(child_url, cache_result=False)
+
+    pending: Deque[Tuple[str, "asyncio.Task[_SitemapDocument]"]] = deque()
+    remaining = iter(child_urls)
+    try:
+        while True:
+            for child_url in islice(remaining, _INDEX_LOOKAHEAD - len(pending)):
+                pending.append((child_url, asyncio.ensure_future(fetch(child_url))))
+            if not pending:
+                return
+            child_url, task = pending.popleft()
+            result: Any
+            try:
+                result = await task
+            except Exception as e:
+                result = e
+            yield child_url, result
+    finally:
+        for _, task in pending:
+            task.cancel()
+        await asyncio.gather(*(task for _, task in pending), return_exceptions=True)
+
+async def _parse_sitemap_internal(url: str, ctx: Context, recursive: bool = False) -> Dict[str, Any]:
+    """
+    Internal function to parse sitemap and extract URLs
+
+    With recursive=True a sitemap index is expanded into the page URLs of its
+    child sitemaps. Children that are themselves indexes are listed under
+    nested_indexes rather than expanded, and the expansion stops at
+    _MAX_INDEX_CHILDREN children or _MAX_MERGED_URLS URLs with truncated set.
+    """
+    try:
+        # Fetch and parse the sitemap XML (served from cache when fresh)
+        await ctx.report_progress(0, 1, "正在下载并解析 sitemap...")
+        document = await _fetch_and_parse(url)
+        urls = document.urls
+
+        expansion: Optional[Dict[str, Any]] = None
+        if recursive and document.sitemap_type == "sitemap_index":
+            failed_sitemaps: List[Dict[str, str]] = []
+            nested_indexes: List[str] = []
+            truncated = len(urls) > _MAX_INDEX_CHILDREN
+            child_urls = urls[:_MAX_INDEX_CHILDREN]
+            urls = []
+            async with aclosing(_fetch_children(child_urls)) as children:
+                async for child_url, child in children:
+                    if isinstance(child, BaseException):
+                        failed_sitemaps.append({"url": child_url, "error": str(child)})
+                    elif child.sitemap_type == "sitemap_index":
+                        # Its locs are sitemaps, not pages
+                        nested_indexes.append(child_url)
+                    else:
+                        room = _MAX_MERGED_URLS - len(urls)
+                        urls.extend(child.urls[:room])
+                        if len(child.urls) > room:
+                            truncated = True
+                            break
+            expansion = {
+                "child_sitemaps": len(document.urls),
+                "failed_sitemaps": failed_sitemaps,
+                "nested_indexes": nested_indexes,
+                "truncated": truncated
+            }
 
-        await ctx.report_progress(3, 3, f"解析完成，找到 {len(urls)} 个 URLs")
+        await ctx.report_progress(1, 1, f"解析完成，找到 {len(urls)} 个 URLs")
 
         result = {
             "source_url": url,
             "total_urls": len(urls),
             "urls": urls,
-            "sitemap_type": _detect_sitemap_type(parsed_data),
+            "sitemap_type": document.sitemap_type,
             "success": True
         }
+        if expansion is not None:
+            result.update(expansion)
 
         return result
 
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         error_msg = f"网络请求错误: {str(e)}"
         ctx.error(error_msg)
         return {"success": False, "error": error_msg, "source_url": url}
@@ -103,18 +421,19 @@ async def _parse_sitemap_internal(url: str, ctx: Context) -> Dict[str, Any]:
         return {"success": False, "error": error_msg, "source_url": url}
 
 @mcp.tool()
-async def parse_sitemap(url: str, ctx: Context) -> Dict[str, Any]:
+async def parse_sitemap(url: str, ctx: Context, recursive: bool = False) -> Dict[str, Any]:
     """
     Parse a sitemap XML from URL and extract all URLs
 
     Args:
         url: Sitemap URL to parse
+        recursive: Expand a sitemap index into the URLs of its child sitemaps
 
     Returns:
         Dictionary containing parsed URLs and metadata
     """
     ctx.info(f"开始解析 sitemap: {url}")
-    result = await _parse_sitemap_internal(url, ctx)
+    result = await _parse_sitemap_internal(url, ctx, recursive)
 
     if result.get("success"):
         ctx.info(f"成功解析 sitemap，共 {result['total_urls']} 个 URLs")
@@ -122,12 +441,13 @@ async def parse_sitemap(url: str, ctx: Context) -> Dict[str, Any]:
     return result
 
 @mcp.tool()
-async def analyze_sitemap(url: str, ctx: Context) -> Dict[str, Any]:
+async def analyze_sitemap(url: str, ctx: Context, recursive: bool = False) -> Dict[str, Any]:
     """
     Analyze sitemap and provide detailed statistics
 
     Args:
         url: Sitemap URL to analyze
+        recursive: Analyze the URLs of every child sitemap of a sitemap index
 
     Returns:
         Detailed analysis including URL patterns, domains, etc.
@@ -135,7 +455,7 @@ async def analyze_sitemap(url: str, ctx: Context) -> Dict[str, Any]:
     ctx.info(f"开始分析 sitemap: {url}")
 
     # First parse the sitemap
-    parse_result = await _parse_sitemap_internal(url, ctx)
+    parse_result = await _parse_sitemap_internal(url, ctx, recursive)
 
     if not parse_result.get("success"):
         return parse_result
@@ -143,35 +463,36 @@ async def analyze_sitemap(url: str, ctx: Context) -> Dict[str, Any]:
     urls = parse_result["urls"]
 
     # Analyze URL patterns
-    domains = {}
-    paths = {}
-    extensions = {}
+    domains = Counter()
+    paths = Counter()
+    extensions = Counter()
 
     for url_item in urls:
-        parsed_url = urlparse(url_item)
+        parsed_url = urlsplit(url_item)
+        path = parsed_url.path
 
         # Count domains
-        domain = parsed_url.netloc
-        domains[domain] = domains.get(domain, 0) + 1
+        domains[parsed_url.netloc] += 1
 
-        # Count path patterns
-        path_parts = parsed_url.path.split('/')
+        # Count path patterns (only the first segment is needed)
+        path_parts = path.split('/', 2)
         if len(path_parts) > 1:
-            first_path = f"/{path_parts[1]}" if path_parts[1] else "/"
-            paths[first_path] = paths.get(first_path, 0) + 1
+            paths[f"/{path_parts[1]}" if path_parts[1] else "/"] += 1
 
-        # Count file extensions
-        if '.' in parsed_url.path:
-            ext = parsed_url.path.split('.')[-1].lower()
-            extensions[ext] = extensions.get(ext, 0) + 1
+        # Count file extensions, following os.path.splitext's rules: the
+        # extension follows the last dot of the file name, and leading dots
+        # (as in .htaccess) don't start one
+        stem, dot, ext = path.rpartition('/')[2].rpartition('.')
+        if dot and ext and stem.strip('.'):
+            extensions[ext.lower()] += 1
 
     analysis = {
         "source_url": url,
         "total_urls": len(urls),
         "unique_domains": len(domains),
-        "domain_distribution": dict(sorted(domains.items(), key=lambda x: x[1], reverse=True)[:10]),
-        "path_patterns": dict(sorted(paths.items(), key=lambda x: x[1], reverse=True)[:10]),
-        "file_extensions": dict(sorted(extensions.items(), key=lambda x: x[1], reverse=True)),
+        "domain_distribution": dict(domains.most_common(10)),
+        "path_patterns": dict(paths.most_common(10)),
+        "file_extensions": dict(extensions.most_common()),
         "sitemap_type": parse_result["sitemap_type"],
         "success": True
     }
@@ -193,11 +514,8 @@ async def validate_sitemap(url: str, ctx: Context) -> Dict[str, Any]:
     ctx.info(f"开始验证 sitemap: {url}")
 
     try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-
-        parsed_data = xmltodict.parse(response.text)
-        urls = _extract_urls(parsed_data)
+        document = await _fetch_and_parse(url)
+        urls = document.urls
 
         validation_issues = []
         warnings = []
@@ -207,25 +525,27 @@ async def validate_sitemap(url: str, ctx: Context) -> Dict[str, Any]:
             validation_issues.append(f"URL数量超限: {len(urls)} > 50,000")
 
         # Check file size (max 50MB uncompressed)
-        content_size = len(response.content)
+        content_size = document.content_size
         if content_size > 50 * 1024 * 1024:
             validation_issues.append(f"文件大小超限: {content_size / (1024*1024):.1f}MB > 50MB")
         elif content_size > 10 * 1024 * 1024:
             warnings.append(f"文件较大: {content_size / (1024*1024):.1f}MB")
 
-        # Check URL format
+        # Check URL format, stopping once enough issues have been found to report
         invalid_urls = []
-        for i, url_item in enumerate(urls[:100]):  # Check first 100 URLs
+        for i, url_item in enumerate(urls):
             if len(url_item) > 2048:
                 invalid_urls.append(f"URL #{i+1} 长度超限")
             if not url_item.startswith(('http://', 'https://')):
                 invalid_urls.append(f"URL #{i+1} 协议无效")
+            if len(invalid_urls) >= 5:
+                break
 
         if invalid_urls:
             validation_issues.extend(invalid_urls[:5])  # Show first 5 issues
 
         # Check XML structure
-        sitemap_type = _detect_sitemap_type(parsed_data)
+        sitemap_type = document.sitemap_type
         if sitemap_type == "unknown":
             validation_issues.append("无法识别的 sitemap 格式")
 
@@ -252,20 +572,21 @@ async def validate_sitemap(url: str, ctx: Context) -> Dict[str, Any]:
         return {"success": False, "error": error_msg, "source_url": url}
 
 @mcp.tool()
-async def extract_domain_info(url: str, ctx: Context, limit: int = 10) -> Dict[str, Any]:
+async def extract_domain_info(url: str, ctx: Context, limit: int = 10, recursive: bool = False) -> Dict[str, Any]:
     """
     Extract and analyze domain information from sitemap URLs
 
     Args:
         url: Sitemap URL to analyze
         limit: Maximum number of sample URLs to return per domain
+        recursive: Include the URLs of every child sitemap of a sitemap index
 
     Returns:
         Domain analysis with sample URLs
     """
     ctx.info(f"开始提取域名信息: {url}")
 
-    parse_result = await _parse_sitemap_internal(url, ctx)
+    parse_result = await _parse_sitemap_internal(url, ctx, recursive)
 
     if not parse_result.get("success"):
         return parse_result
@@ -274,23 +595,26 @@ async def extract_domain_info(url: str, ctx: Context, limit: int = 10) -> Dict[s
     domain_info = {}
 
     for url_item in urls:
-        parsed_url = urlparse(url_item)
+        parsed_url = urlsplit(url_item)
         domain = parsed_url.netloc
 
-        if domain not in domain_info:
-            domain_info[domain] = {
+        domain_data = domain_info.get(domain)
+        if domain_data is None:
+            domain_data = domain_info[domain] = {
                 "count": 0,
                 "sample_urls": [],
                 "paths": set(),
                 "schemes": set()
             }
 
-        domain_data = domain_info[domain]
-        domain_data["count"] += 1
+        count = domain_data["count"] + 1
+        domain_data["count"] = count
         domain_data["schemes"].add(parsed_url.scheme)
-        domain_data["paths"].add(parsed_url.path.split('/')[1] if len(parsed_url.path.split('/')) > 1 else '/')
+        path_parts = parsed_url.path.split('/', 2)
+        domain_data["paths"].add(path_parts[1] if len(path_parts) > 1 else '/')
 
-        if len(domain_data["sample_urls"]) < limit:
+        # The first `limit` URLs of each domain are its samples
+        if count <= limit:
             domain_data["sample_urls"].append(url_item)
 
     # Convert sets to lists for JSON serialization
@@ -324,78 +648,25 @@ async def analyze_update_patterns(url: str, ctx: Context) -> Dict[str, Any]:
     ctx.info(f"开始分析网站更新模式: {url}")
 
     try:
-        await ctx.report_progress(0, 3, "正在下载并解析 sitemap...")
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
+        await ctx.report_progress(0, 2, "正在下载并解析 sitemap...")
+        document = await _fetch_and_parse(url)
+        url_details = document.url_details
 
-        parsed_data = xmltodict.parse(response.text)
-        url_details = _extract_url_details(parsed_data)
-
-        await ctx.report_progress(1, 3, "正在分析更新模式...")
-        update_analysis = _analyze_update_patterns(url_details)
-
-        await ctx.report_progress(2, 3, "正在提取最近更新...")
-        recent_updates = _get_recent_updates(url_details, limit=50)
-
-        # 分析域名级别的更新模式
-        domain_updates = {}
-        for item in url_details:
-            if item.get('lastmod'):
-                parsed_url = urlparse(item['loc'])
-                domain = parsed_url.netloc
-                if domain not in domain_updates:
-                    domain_updates[domain] = {
-                        'count': 0,
-                        'latest_update': None,
-                        'changefreqs': set(),
-                        'avg_priority': []
-                    }
-
-                domain_updates[domain]['count'] += 1
-                if item.get('changefreq'):
-                    domain_updates[domain]['changefreqs'].add(item['changefreq'])
-                if item.get('priority'):
-                    try:
-                        domain_updates[domain]['avg_priority'].append(float(item['priority']))
-                    except (ValueError, TypeError):
-                        pass
-
-                # 更新最新更新时间
-                try:
-                    lastmod = item['lastmod']
-                    if 'T' in lastmod:
-                        lastmod_date = datetime.fromisoformat(lastmod.replace('Z', '+00:00'))
-                    else:
-                        lastmod_date = datetime.strptime(lastmod, '%Y-%m-%d')
-
-                    if not domain_updates[domain]['latest_update'] or lastmod_date > domain_updates[domain]['latest_update']:
-                        domain_updates[domain]['latest_update'] = lastmod_date
-                except (ValueError, TypeError):
-                    pass
-
-        # 计算平均优先级
-        for domain, data in domain_updates.items():
-            data['changefreqs'] = list(data['changefreqs'])
-            if data['avg_priority']:
-                data['avg_priority'] = sum(data['avg_priority']) / len(data['avg_priority'])
-            else:
-                data['avg_priority'] = None
+        await ctx.report_progress(1, 2, "正在分析更新模式...")
+        report = _compute_update_report(url_details, recent_limit=50)
+        recent_updates = report["recent_updates"]
 
-        await ctx.report_progress(3, 3, "分析完成")
+        await ctx.report_progress(2, 2, "分析完成")
 
         result = {
             "source_url": url,
             "analyzed_at": datetime.now().isoformat(),
-            "sitemap_type": _detect_sitemap_type(parsed_data),
+            "sitemap_type": document.sitemap_type,
             "total_urls": len(url_details),
-            "metadata_coverage": {
-                "urls_with_lastmod": sum(1 for item in url_details if item.get('lastmod')),
-                "urls_with_changefreq": sum(1 for item in url_details if item.get('changefreq')),
-                "urls_with_priority": sum(1 for item in url_details if item.get('priority'))
-            },
-            "update_patterns": update_analysis,
+            "metadata_coverage": report["metadata_coverage"],
+            "update_patterns": report["update_patterns"],
             "recent_updates": recent_updates[:20],  # 限制返回数量
-            "domain_update_summary": dict(sorted(domain_updates.items(), key=lambda x: x[1]['count'], reverse=True)[:10]),
+            "domain_update_summary": report["domain_update_summary"],
             "success": True
         }
 
@@ -407,190 +678,266 @@ async def analyze_update_patterns(url: str, ctx: Context) -> Dict[str, Any]:
         ctx.error(error_msg)
         return {"success": False, "error": error_msg, "source_url": url}
 
-def _extract_urls(sitemap_data: Dict[str, Any]) -> List[str]:
-    """Extract URLs from parsed sitemap data (legacy function for compatibility)"""
-    url_details = _extract_url_details(sitemap_data)
-    return [item['loc'] for item in url_details]
-
-def _extract_url_details(sitemap_data: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Extract detailed URL information from parsed sitemap data"""
-    url_details = []
-
-    # Handle standard sitemap format
-    if 'urlset' in sitemap_data:
-        urlset = sitemap_data['urlset']
-        if 'url' in urlset:
-            url_entries = urlset['url']
-
-            if isinstance(url_entries, list):
-                for entry in url_entries:
-                    if 'loc' in entry:
-                        url_info = {
-                            'loc': entry['loc'],
-                            'lastmod': entry.get('lastmod'),
-                            'changefreq': entry.get('changefreq'),
-                            'priority': entry.get('priority')
-                        }
-                        url_details.append(url_info)
-            else:
-                if 'loc' in url_entries:
-                    url_info = {
-                        'loc': url_entries['loc'],
-                        'lastmod': url_entries.get('lastmod'),
-                        'changefreq': url_entries.get('changefreq'),
-                        'priority': url_entries.get('priority')
-                    }
-                    url_details.append(url_info)
-
-    # Handle sitemap index format
-    elif 'sitemapindex' in sitemap_data:
-        sitemapindex = sitemap_data['sitemapindex']
-        if 'sitemap' in sitemapindex:
-            sitemap_entries = sitemapindex['sitemap']
-
-            if isinstance(sitemap_entries, list):
-                for entry in sitemap_entries:
-                    if 'loc' in entry:
-                        url_info = {
-                            'loc': entry['loc'],
-                            'lastmod': entry.get('lastmod'),
-                            'changefreq': None,  # Index doesn't typically have changefreq
-                            'priority': None     # Index doesn't typically have priority
-                        }
-                        url_details.append(url_info)
-            else:
-                if 'loc' in sitemap_entries:
-                    url_info = {
-                        'loc': sitemap_entries['loc'],
-                        'lastmod': sitemap_entries.get('lastmod'),
-                        'changefreq': None,
-                        'priority': None
-                    }
-                    url_details.append(url_info)
-
-    return url_details
-
-def _detect_sitemap_type(sitemap_data: Dict[str, Any]) -> str:
-    """Detect the type of sitemap"""
-    if 'urlset' in sitemap_data:
-        return "standard_sitemap"
-    elif 'sitemapindex' in sitemap_data:
-        return "sitemap_index"
-    else:
-        return "unknown"
+# Root element -> sitemap type, and the entry element each type contains
+_SITEMAP_TYPES = {"urlset": "standard_sitemap", "sitemapindex": "sitemap_index"}
+_ENTRY_TAGS = {"standard_sitemap": "url", "sitemap_index": "sitemap"}
+
+def _local_name(tag: str) -> str:
+    """Strip the {namespace} prefix from an ElementTree tag"""
+    return tag.rpartition('}')[2]
+
+class _SitemapTarget:
+    """
+    ElementTree parser target that collects sitemap entries as they are parsed
+
+    Depth 1 is the root element, depth 2 the <url>/<sitemap> entries and depth
+    3 their fields. No element objects are built, so memory stays flat
+    regardless of sitemap size.
+    """
+
+    def __init__(self) -> None:
+        self.sitemap_type = "unknown"
+        self.url_details: List[_UrlRecord] = []
+        # Set once the root element rules out any entries
+        self.done = False
+        self._depth = 0
+        self._entry_tag: Optional[str] = None
+        self._is_index = False
+        # Fields of the entry being parsed, or None outside an entry
+        self._fields: Optional[Dict[str, str]] = None
+        self._field: Optional[str] = None
+        self._text: List[str] = []
+
+    def start(self, tag: str, attrib: Dict[str, str]) -> None:
+        depth = self._depth = self._depth + 1
+        if depth == 3:
+            if self._fields is not None:
+                self._field = _local_name(tag)
+                self._text = []
+        elif depth == 2:
+            self._fields = {} if _local_name(tag) == self._entry_tag else None
+        elif depth == 1:
+            self.sitemap_type = _detect_sitemap_type(_local_name(tag))
+            self._entry_tag = _ENTRY_TAGS.get(self.sitemap_type)
+            self._is_index = self.sitemap_type == "sitemap_index"
+            self.done = self._entry_tag is None
+
+    def data(self, text: str) -> None:
+        if self._field is not None and self._depth == 3:
+            self._text.append(text)
+
+    def end(self, tag: str) -> None:
+        depth = self._depth
+        self._depth = depth - 1
+        if depth == 3:
+            # _field is only set inside an entry; the _fields check just narrows the type
+            if self._field is not None and self._fields is not None:
+                self._fields[self._field] = "".join(self._text).strip()
+                self._field = None
+        elif depth == 2 and self._fields is not None:
+            fields = self._fields
+            self._fields = None
+            if fields.get('loc'):
+                lastmod = fields.get('lastmod') or None
+                is_index = self._is_index
+                self.url_details.append(_UrlRecord(
+                    loc=fields['loc'],
+                    lastmod=lastmod,
+                    lastmod_dt=_parse_lastmod(lastmod) if lastmod else None,
+                    # Index entries don't carry changefreq/priority
+                    changefreq=None if is_index else fields.get('changefreq') or None,
+                    priority=None if is_index else fields.get('priority') or None
+                ))
+
+class _SitemapParser:
+    """Incremental sitemap parser that is fed raw XML chunks as they arrive"""
+
+    def __init__(self) -> None:
+        self._target = _SitemapTarget()
+        self._parser = ET.XMLParser(target=self._target)
+
+    def feed(self, data: bytes) -> None:
+        """Parse the next chunk of XML, ignoring the rest once the root isn't a sitemap"""
+        if not self._target.done:
+            self._parser.feed(data)
+
+    def close(self) -> Tuple[str, List[_UrlRecord]]:
+        """Finish parsing and return the sitemap type and URL details"""
+        # A root that rules out any entries stops parsing early; nothing to finish
+        if not self._target.done:
+            self._parser.close()
+        return self._target.sitemap_type, self._target.url_details
+
+def _parse_sitemap_xml(content: bytes) -> Tuple[str, List[_UrlRecord]]:
+    """Parse a complete sitemap XML document into its type and URL details"""
+    parser = _SitemapParser()
+    parser.feed(content)
+    return parser.close()
+
+@lru_cache(maxsize=4096)
+def _parse_lastmod(lastmod: str) -> Optional[datetime]:
+    """
+    Parse a lastmod value once, or return None if it isn't a recognised date
+
+    Every result is naive UTC: timezone-aware values are converted, and values
+    without an offset (including date-only ones) are taken to already be UTC.
+    Cached on the raw string because batch-published pages tend to share
+    identical timestamps.
+    """
+    try:
+        if 'T' in lastmod:
+            lastmod_date = datetime.fromisoformat(lastmod.replace('Z', '+00:00'))
+            if lastmod_date.tzinfo is not None:
+                lastmod_date = lastmod_date.astimezone(timezone.utc).replace(tzinfo=None)
+            return lastmod_date
+        return datetime.strptime(lastmod, '%Y-%m-%d')
+    except ValueError:
+        return None
+
+def _detect_sitemap_type(root_tag: str) -> str:
+    """Detect the type of sitemap from its root element name"""
+    return _SITEMAP_TYPES.get(root_tag, "unknown")
+
+@dataclass
+class _DomainUpdates:
+    """Per-domain accumulator for the update summary"""
+    count: int = 0
+    latest_update: Optional[datetime] = None
+    changefreqs: Set[str] = field(default_factory=set)
+    priority_sum: float = 0.0
+    priority_n: int = 0
+
+def _compute_update_report(url_details: List[_UrlRecord], recent_limit: int = 20) -> Dict[str, Any]:
+    """
+    Build metadata coverage, update patterns, recent updates and the per-domain
+    update summary in a single pass over url_details
 
-def _analyze_update_patterns(url_details: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """Analyze update patterns from URL details"""
-    changefreq_stats = {}
-    priority_stats = {}
-    lastmod_stats = {
+    lastmod values are naive UTC (see _parse_lastmod), so the recency windows
+    are measured from the current UTC time and reported dates are UTC.
+    """
+    coverage = {"urls_with_lastmod": 0, "urls_with_changefreq": 0, "urls_with_priority": 0}
+    changefreq_stats: Counter[str] = Counter()
+    priority_stats: Counter[str] = Counter()
+    lastmod_stats: Dict[str, Any] = {
         "total_with_lastmod": 0,
         "date_range": {"earliest": None, "latest": None},
         "recent_updates_7d": 0,
         "recent_updates_30d": 0
     }
+    domain_updates: DefaultDict[str, _DomainUpdates] = defaultdict(_DomainUpdates)
+    # 大小为 recent_limit 的最小堆；-index 让同一时间的条目保持原顺序
+    recent_heap: List[Tuple[datetime, int, _UrlRecord]] = []
 
-    now = datetime.now()
+    # (now - lastmod).days <= N holds exactly when lastmod > now - (N + 1) days,
+    # so the recency windows become one datetime compare each
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    cutoff_7d = now - timedelta(days=8)
+    cutoff_30d = now - timedelta(days=31)
 
-    for item in url_details:
+    for index, item in enumerate(url_details):
         # 分析 changefreq
-        changefreq = item.get('changefreq')
+        changefreq = item.changefreq
         if changefreq:
-            changefreq_stats[changefreq] = changefreq_stats.get(changefreq, 0) + 1
+            coverage["urls_with_changefreq"] += 1
+            changefreq_stats[changefreq] += 1
 
         # 分析 priority
-        priority = item.get('priority')
+        priority = item.priority
+        priority_float: Optional[float] = None
         if priority:
+            coverage["urls_with_priority"] += 1
             try:
                 priority_float = float(priority)
                 priority_range = f"{int(priority_float * 10) / 10:.1f}"
-                priority_stats[priority_range] = priority_stats.get(priority_range, 0) + 1
+                priority_stats[priority_range] += 1
             except (ValueError, TypeError):
                 pass
 
-        # 分析 lastmod
-        lastmod = item.get('lastmod')
-        if lastmod:
-            lastmod_stats["total_with_lastmod"] += 1
-            try:
-                # 尝试解析日期格式
-                if 'T' in lastmod:
-                    lastmod_date = datetime.fromisoformat(lastmod.replace('Z', '+00:00'))
-                else:
-                    lastmod_date = datetime.strptime(lastmod, '%Y-%m-%d')
-
-                # 更新日期范围
-                if not lastmod_stats["date_range"]["earliest"] or lastmod_date < lastmod_stats["date_range"]["earliest"]:
-                    lastmod_stats["date_range"]["earliest"] = lastmod_date
-                if not lastmod_stats["date_range"]["latest"] or lastmod_date > lastmod_stats["date_range"]["latest"]:
-                    lastmod_stats["date_range"]["latest"] = lastmod_date
-
-                # 计算最近更新
-                days_diff = (now - lastmod_date).days
-                if days_diff <= 7:
-                    lastmod_stats["recent_updates_7d"] += 1
-                if days_diff <= 30:
-                    lastmod_stats["recent_updates_30d"] += 1
+        # 分析 lastmod，域名汇总只统计带 lastmod 的 URL
+        if not item.lastmod:
+            continue
+        coverage["urls_with_lastmod"] += 1
+        lastmod_stats["total_with_lastmod"] += 1
 
-            except (ValueError, TypeError):
-                pass
+        domain = domain_updates[urlsplit(item.loc).netloc]
+        domain.count += 1
+        if changefreq:
+            domain.changefreqs.add(changefreq)
+        if priority_float is not None:
+            domain.priority_sum += priority_float
+            domain.priority_n += 1
+
+        # 解析结果在提取阶段已缓存，无法识别的日期为 None
+        lastmod_date = item.lastmod_dt
+        if not lastmod_date:
+            continue
+        entry = (lastmod_date, -index, item)
+        if len(recent_heap) < recent_limit:
+            heapq.heappush(recent_heap, entry)
+        elif recent_heap and entry > recent_heap[0]:
+            heapq.heapreplace(recent_heap, entry)
+
+        if not domain.latest_update or lastmod_date > domain.latest_update:
+            domain.latest_update = lastmod_date
+
+        # 更新日期范围
+        if not lastmod_stats["date_range"]["earliest"] or lastmod_date < lastmod_stats["date_range"]["earliest"]:
+            lastmod_stats["date_range"]["earliest"] = lastmod_date
+        if not lastmod_stats["date_range"]["latest"] or lastmod_date > lastmod_stats["date_range"]["latest"]:
+            lastmod_stats["date_range"]["latest"] = lastmod_date
+
+        # 计算最近更新
+        if lastmod_date > cutoff_7d:
+            lastmod_stats["recent_updates_7d"] += 1
+        if lastmod_date > cutoff_30d:
+            lastmod_stats["recent_updates_30d"] += 1
+
+    # 最新的在前，只取前 N 个
+    recent_updates = [
+        {
+            'url': item.loc,
+            'lastmod': item.lastmod,
+            'changefreq': item.changefreq,
+            'priority': item.priority
+        }
+        for _, _, item in sorted(recent_heap, reverse=True)
+    ]
+
+    # 取 URL 数最多的 10 个域名，并计算平均优先级
+    domain_summary: Dict[str, Dict[str, Any]] = {}
+    for name, data in heapq.nlargest(10, domain_updates.items(), key=lambda x: x[1].count):
+        domain_summary[name] = {
+            'count': data.count,
+            'latest_update': data.latest_update,
+            'changefreqs': list(data.changefreqs),
+            'avg_priority': data.priority_sum / data.priority_n if data.priority_n else None
+        }
 
     return {
-        "changefreq_distribution": changefreq_stats,
-        "priority_distribution": priority_stats,
-        "lastmod_analysis": lastmod_stats
+        "metadata_coverage": coverage,
+        "update_patterns": {
+            "changefreq_distribution": dict(changefreq_stats),
+            "priority_distribution": dict(priority_stats),
+            "lastmod_analysis": lastmod_stats
+        },
+        "recent_updates": recent_updates,
+        "domain_update_summary": domain_summary
     }
 
-def _get_recent_updates(url_details: List[Dict[str, Any]], limit: int = 20) -> List[Dict[str, Any]]:
-    """Get recent updates sorted by lastmod date"""
-    updates_with_dates = []
-
-    for item in url_details:
-        lastmod = item.get('lastmod')
-        if lastmod:
-            try:
-                if 'T' in lastmod:
-                    lastmod_date = datetime.fromisoformat(lastmod.replace('Z', '+00:00'))
-                else:
-                    lastmod_date = datetime.strptime(lastmod, '%Y-%m-%d')
-
-                updates_with_dates.append({
-                    'url': item['loc'],
-                    'lastmod': lastmod,
-                    'lastmod_parsed': lastmod_date,
-                    'changefreq': item.get('changefreq'),
-                    'priority': item.get('priority')
-                })
-            except (ValueError, TypeError):
-                pass
-
-    # 按日期排序，最新的在前
-    updates_with_dates.sort(key=lambda x: x['lastmod_parsed'], reverse=True)
-
-    # 移除 lastmod_parsed 字段并返回前 N 个
-    result = []
-    for item in updates_with_dates[:limit]:
-        result_item = {k: v for k, v in item.items() if k != 'lastmod_parsed'}
-        result.append(result_item)
-
-    return result
-
 @mcp.resource("data://sitemap/{url}")
-def get_sitemap_data(url: str) -> str:
+async def get_sitemap_data(url: str) -> str:
     """
     Get cached sitemap data for a URL
     """
     try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        parsed_data = xmltodict.parse(response.text)
-        urls = _extract_urls(parsed_data)
+        document = await _fetch_and_parse(url)
+        urls = document.urls
 
         cache_data = {
             "url": url,
-            "cached_at": "2024-01-01T00:00:00Z",  # This would be current timestamp in real implementation
+            "cached_at": document.fetched_at.isoformat(),
             "total_urls": len(urls),
-            "sitemap_type": _detect_sitemap_type(parsed_data),
+            "sitemap_type": document.sitemap_type,
             "first_10_urls": urls[:10]
         }
 
@@ -600,30 +947,34 @@ def get_sitemap_data(url: str) -> str:
         return json.dumps({"error": str(e)}, indent=2, ensure_ascii=False)
 
 @mcp.resource("data://sitemap/updates/{url}")
-def get_sitemap_updates(url: str) -> str:
+async def get_sitemap_updates(url: str) -> str:
     """
     Get detailed update records and patterns from a sitemap
     """
     try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        parsed_data = xmltodict.parse(response.text)
-        url_details = _extract_url_details(parsed_data)
+        document = await _fetch_and_parse(url)
+        url_details = document.url_details
 
         # 分析更新模式
-        update_analysis = _analyze_update_patterns(url_details)
+        report = _compute_update_report(url_details, recent_limit=20)
 
         update_data = {
             "url": url,
             "analyzed_at": datetime.now().isoformat(),
-            "sitemap_type": _detect_sitemap_type(parsed_data),
+            "sitemap_type": document.sitemap_type,
             "total_urls": len(url_details),
-            "urls_with_lastmod": sum(1 for item in url_details if item.get('lastmod')),
-            "urls_with_changefreq": sum(1 for item in url_details if item.get('changefreq')),
-            "urls_with_priority": sum(1 for item in url_details if item.get('priority')),
-            "update_patterns": update_analysis,
-            "recent_updates": _get_recent_updates(url_details, limit=20),
-            "sample_urls_with_metadata": url_details[:10]
+            **report["metadata_coverage"],
+            "update_patterns": report["update_patterns"],
+            "recent_updates": report["recent_updates"],
+            "sample_urls_with_metadata": [
+                {
+                    'loc': item.loc,
+                    'lastmod': item.lastmod,
+                    'changefreq': item.changefreq,
+                    'priority': item.priority
+                }
+                for item in url_details[:10]
+            ]
         }
 
         return json.dumps(update_data, indent=2, ensure_ascii=False, default=str)
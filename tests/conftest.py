@@ -1,11 +1,26 @@
 """
 Pytest configuration and fixtures
 """
-from unittest.mock import AsyncMock, Mock
+from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
 from fastmcp import Context
 
+from sitemap_server import _SITEMAP_CACHE
+
+
+@pytest.fixture(autouse=True)
+def clear_sitemap_cache():
+    """Start every test with an empty sitemap cache"""
+    _SITEMAP_CACHE.clear()
+
+
+@pytest.fixture(autouse=True)
+def isolated_disk_cache(tmp_path):
+    """Point the sitemap disk cache at a per-test directory"""
+    with patch("sitemap_server._DISK_CACHE_DIR", str(tmp_path / "sitemap-cache")):
+        yield
+
 
 @pytest.fixture
 def mock_context():
@@ -1,13 +1,20 @@
 """
-Unit tests for calculator.py core functions
+Unit tests for calculator_core.py
 """
+import json
+import math
+
 import pytest
 
-from calculator import (
+from calculator_core import (
+    CONFIG_JSON,
+    _calculate,
+    _calculate_cached,
     calculate_next_version,
     calculate_operation,
     get_config_data,
     get_operation_data,
+    get_operation_json,
 )
 
 
@@ -107,6 +114,50 @@ class TestCalculateOperation:
         assert result == 0
 
 
+class TestCalculateOperationCache:
+    """Test memoization of calculate_operation"""
+
+    def setup_method(self):
+        _calculate_cached.cache_clear()
+
+    def test_repeated_call_hits_cache(self):
+        """Test identical calls are served from the cache"""
+        calculate_operation("subtract", [10.0, 3.0])
+        calculate_operation("subtract", [10.0, 3.0])
+        assert _calculate_cached.cache_info().hits == 1
+
+    @pytest.mark.parametrize("method,args", [
+        ("add", [0.3, 0.2, 0.1]),
+        ("add", [1e16, 1.0, -1e16, 1.0]),
+        ("multiply", [1e308, 10.0, 1e-308]),
+    ])
+    def test_cached_result_matches_uncached(self, method, args):
+        """Test the cache never changes order-sensitive float results"""
+        expected = _calculate(method, args)
+        assert calculate_operation(method, args) == expected
+        # Same values in another order are a separate slot with their own result
+        assert calculate_operation(method, args[::-1]) == _calculate(method, args[::-1])
+        assert calculate_operation(method, args) == expected
+        assert _calculate_cached.cache_info().hits == 1
+
+    def test_non_commutative_args_not_shared(self):
+        """Test argument order is preserved for subtract"""
+        assert calculate_operation("subtract", [10.0, 3.0]) == 7
+        assert calculate_operation("subtract", [3.0, 10.0]) == -7
+
+    def test_nan_bypasses_cache(self):
+        """Test NaN arguments are computed without caching"""
+        result = calculate_operation("add", [math.nan, 1.0])
+        assert math.isnan(result)
+        assert _calculate_cached.cache_info().currsize == 0
+
+    def test_errors_not_cached(self):
+        """Test invalid calls keep raising"""
+        for _ in range(2):
+            with pytest.raises(ValueError, match="Cannot divide by zero"):
+                calculate_operation("divide", [1.0, 0.0])
+
+
 class TestGetConfigData:
     """Test the get_config_data function"""
 
@@ -135,6 +186,19 @@ class TestGetConfigData:
         assert add_op["max_args"] is None
         assert "example" in add_op
 
+    def test_mutating_result_does_not_leak(self):
+        """Test callers get a copy that doesn't alter later results"""
+        config = get_config_data()
+        config["version"] = "9.9.9"
+        config["operations"][0]["name"] = "changed"
+
+        assert get_config_data()["version"] == "1.0.0"
+        assert get_config_data()["operations"][0]["name"] == "add"
+
+    def test_config_json_matches_data(self):
+        """Test the pre-serialized config JSON matches the config dict"""
+        assert CONFIG_JSON == json.dumps(get_config_data(), indent=2, ensure_ascii=False)
+
 
 class TestGetOperationData:
     """Test the get_operation_data function"""
@@ -162,6 +226,24 @@ class TestGetOperationData:
             assert "error" not in operation
             assert operation["name"] == op_name
 
+    def test_mutating_result_does_not_leak(self):
+        """Test callers get a copy that doesn't alter later results"""
+        get_operation_data("add")["min_args"] = 99
+        get_operation_data("invalid")["error"] = "changed"
+
+        assert get_operation_data("add")["min_args"] == 2
+        assert get_operation_data("invalid")["error"] == "Operation not found"
+
+    def test_operation_json_matches_data(self):
+        """Test the pre-serialized operation JSON matches the operation dicts"""
+        for op_name in get_config_data()["supported_operations"]:
+            expected = json.dumps(get_operation_data(op_name), indent=2, ensure_ascii=False)
+            assert get_operation_json(op_name) == expected
+
+    def test_operation_json_unknown_name(self):
+        """Test an unknown name returns the not-found JSON"""
+        assert json.loads(get_operation_json("invalid")) == {"error": "Operation not found"}
+
 
 class TestCalculateNextVersion:
     """Test the calculate_next_version function"""
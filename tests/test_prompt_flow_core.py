@@ -0,0 +1,28 @@
+"""
+Unit tests for prompt_flow_core.py
+"""
+from prompt_flow_core import render_report
+
+
+class TestRenderReport:
+    """Test the render_report function"""
+
+    def test_report_with_data(self):
+        """Test statistics are filled in and the average has 2 decimals"""
+        report = render_report("销售报告", [10, 20, 25])
+
+        assert report.startswith("# 销售报告\n")
+        assert "- 项目 1: 10\n- 项目 2: 20\n- 项目 3: 25" in report
+        assert "- 总数量: 3" in report
+        assert "- 最大值: 25" in report
+        assert "- 最小值: 10" in report
+        assert "- 平均值: 18.33" in report
+
+    def test_report_empty_data(self):
+        """Test empty data renders N/A statistics instead of raising"""
+        report = render_report("空报告", [])
+
+        assert "- 总数量: 0" in report
+        assert "- 最大值: N/A" in report
+        assert "- 最小值: N/A" in report
+        assert "- 平均值: N/A" in report
@@ -1,72 +1,131 @@
 """
 Unit tests for sitemap_server.py
 """
-from unittest.mock import Mock, patch
+import asyncio
+import gzip
+import os
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, patch
 
+import httpx
 import pytest
 
 from sitemap_server import (
-    _analyze_update_patterns,
+    _SITEMAP_CACHE,
+    _compute_update_report,
     _detect_sitemap_type,
-    _extract_url_details,
-    _extract_urls,
-    _get_recent_updates,
+    _disk_cache_path,
+    _download,
+    _fetch_and_parse,
+    _parse_lastmod,
     _parse_sitemap_internal,
+    _parse_sitemap_xml,
+    _SitemapParser,
+    _UrlRecord,
 )
 
 
-class TestExtractUrls:
-    """Test the _extract_urls helper function"""
+class TestParseSitemapXml:
+    """Test the _parse_sitemap_xml streaming parser"""
 
-    def test_extract_urls_standard_sitemap(self):
+    def test_parse_standard_sitemap(self, sample_sitemap_xml):
         """Test URL extraction from standard sitemap"""
-        sitemap_data = {
-            "urlset": {
-                "url": [
-                    {"loc": "https://example.com/page1"},
-                    {"loc": "https://example.com/page2"}
-                ]
-            }
-        }
+        sitemap_type, url_details = _parse_sitemap_xml(sample_sitemap_xml.encode())
+
+        assert sitemap_type == "standard_sitemap"
+        assert [item.loc for item in url_details] == [
+            "https://example.com/page1",
+            "https://example.com/page2"
+        ]
 
-        urls = _extract_urls(sitemap_data)
-        assert len(urls) == 2
-        assert "https://example.com/page1" in urls
-        assert "https://example.com/page2" in urls
+    def test_parse_fed_in_chunks(self, sample_sitemap_xml):
+        """Test feeding the document in small chunks gives the same result"""
+        content = sample_sitemap_xml.encode()
+        parser = _SitemapParser()
+        for i in range(0, len(content), 7):
+            parser.feed(content[i:i + 7])
 
-    def test_extract_urls_single_url(self):
+        assert parser.close() == _parse_sitemap_xml(content)
+
+    def test_parse_single_url(self):
         """Test URL extraction from sitemap with single URL"""
-        sitemap_data = {
-            "urlset": {
-                "url": {"loc": "https://example.com/page1"}
-            }
-        }
+        xml = b"""<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+            <url><loc>https://example.com/page1</loc></url>
+        </urlset>"""
 
-        urls = _extract_urls(sitemap_data)
-        assert len(urls) == 1
-        assert urls[0] == "https://example.com/page1"
+        _, url_details = _parse_sitemap_xml(xml)
+        assert len(url_details) == 1
+        assert url_details[0].loc == "https://example.com/page1"
 
-    def test_extract_urls_sitemap_index(self):
+    def test_parse_sitemap_index(self, sample_sitemap_index_xml):
         """Test URL extraction from sitemap index"""
-        sitemap_data = {
-            "sitemapindex": {
-                "sitemap": [
-                    {"loc": "https://example.com/sitemap1.xml"},
-                    {"loc": "https://example.com/sitemap2.xml"}
-                ]
-            }
-        }
+        sitemap_type, url_details = _parse_sitemap_xml(sample_sitemap_index_xml.encode())
 
-        urls = _extract_urls(sitemap_data)
-        assert len(urls) == 2
-        assert "https://example.com/sitemap1.xml" in urls
-        assert "https://example.com/sitemap2.xml" in urls
+        assert sitemap_type == "sitemap_index"
+        assert [item.loc for item in url_details] == [
+            "https://example.com/sitemap1.xml",
+            "https://example.com/sitemap2.xml"
+        ]
+        assert url_details[0].lastmod == "2024-01-01T00:00:00Z"
+        assert url_details[0].changefreq is None
+        assert url_details[0].priority is None
 
-    def test_extract_urls_empty_sitemap(self):
+    def test_parse_empty_sitemap(self):
         """Test URL extraction from empty sitemap"""
-        sitemap_data = {}
-        urls = _extract_urls(sitemap_data)
-        assert urls == []
+        xml = b'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"></urlset>'
+        assert _parse_sitemap_xml(xml) == ("standard_sitemap", [])
+
+    def test_parse_unknown_root(self):
+        """Test documents with an unknown root yield no URLs"""
+        xml = b"<rss><url><loc>https://example.com/page1</loc></url></rss>"
+        assert _parse_sitemap_xml(xml) == ("unknown", [])
+
+    def test_parse_unknown_root_stops_at_first_tag(self):
+        """Test an unknown root is reported without reading the rest of the body"""
+        xml = b"<html><body><p>not a sitemap"
+        assert _parse_sitemap_xml(xml) == ("unknown", [])
+
+    def test_parse_with_metadata(self, sample_sitemap_xml):
+        """Test URL details extraction with full metadata"""
+        _, url_details = _parse_sitemap_xml(sample_sitemap_xml.encode())
+
+        first_url = url_details[0]
+        assert first_url.loc == "https://example.com/page1"
+        assert first_url.lastmod == "2024-01-01"
+        assert first_url.changefreq == "daily"
+        assert first_url.priority == "0.8"
+
+    def test_parse_partial_metadata(self):
+        """Test URL details extraction with partial metadata"""
+        xml = b"""<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+            <url>
+                <loc>https://example.com/page1</loc>
+                <lastmod>2024-01-01</lastmod>
+            </url>
+        </urlset>"""
+
+        _, url_details = _parse_sitemap_xml(xml)
+        assert len(url_details) == 1
+
+        url_info = url_details[0]
+        assert url_info.loc == "https://example.com/page1"
+        assert url_info.lastmod == "2024-01-01"
+        assert url_info.changefreq is None
+        assert url_info.priority is None
+
+    def test_parse_skips_entries_without_loc(self):
+        """Test entries missing <loc> and nested extension tags are ignored"""
+        xml = b"""<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"
+                xmlns:image="http://www.google.com/schemas/sitemap-image/1.1">
+            <url><lastmod>2024-01-01</lastmod></url>
+            <url>
+                <loc>https://example.com/page1</loc>
+                <image:image><image:loc>https://example.com/a.png</image:loc></image:image>
+            </url>
+        </urlset>"""
+
+        _, url_details = _parse_sitemap_xml(xml)
+        assert [item.loc for item in url_details] == ["https://example.com/page1"]
 
 
 class TestDetectSitemapType:
@@ -74,42 +133,34 @@ class TestDetectSitemapType:
 
     def test_detect_standard_sitemap(self):
         """Test detection of standard sitemap"""
-        sitemap_data = {"urlset": {}}
-        assert _detect_sitemap_type(sitemap_data) == "standard_sitemap"
+        assert _detect_sitemap_type("urlset") == "standard_sitemap"
 
     def test_detect_sitemap_index(self):
         """Test detection of sitemap index"""
-        sitemap_data = {"sitemapindex": {}}
-        assert _detect_sitemap_type(sitemap_data) == "sitemap_index"
+        assert _detect_sitemap_type("sitemapindex") == "sitemap_index"
 
     def test_detect_unknown_type(self):
         """Test detection of unknown sitemap type"""
-        sitemap_data = {"unknown": {}}
-        assert _detect_sitemap_type(sitemap_data) == "unknown"
+        assert _detect_sitemap_type("unknown") == "unknown"
+
+
+def _serve(body, headers=None):
+    """Build a _download stand-in that feeds body and returns its size"""
+    async def download(url, feed, request_headers=None):
+        feed(body)
+        return len(body), httpx.Headers(headers or {})
+    return download
 
 
 class TestParseSitemapInternal:
     """Test the _parse_sitemap_internal function"""
 
     @pytest.mark.asyncio
-    @patch('sitemap_server.requests.get')
-    @patch('sitemap_server.xmltodict.parse')
-    async def test_parse_sitemap_success(self, mock_xmlparse, mock_get, mock_context, sample_sitemap_xml):
+    @patch('sitemap_server._download', new_callable=AsyncMock)
+    async def test_parse_sitemap_success(self, mock_download, mock_context, sample_sitemap_xml):
         """Test successful sitemap parsing"""
         # Setup mocks
-        mock_response = Mock()
-        mock_response.text = sample_sitemap_xml
-        mock_response.raise_for_status.return_value = None
-        mock_get.return_value = mock_response
-
-        mock_xmlparse.return_value = {
-            "urlset": {
-                "url": [
-                    {"loc": "https://example.com/page1"},
-                    {"loc": "https://example.com/page2"}
-                ]
-            }
-        }
+        mock_download.side_effect = _serve(sample_sitemap_xml.encode())
 
         result = await _parse_sitemap_internal("https://example.com/sitemap.xml", mock_context)
 
@@ -119,10 +170,184 @@ class TestParseSitemapInternal:
         assert "https://example.com/page1" in result["urls"]
 
     @pytest.mark.asyncio
-    @patch('sitemap_server.requests.get')
-    async def test_parse_sitemap_network_error(self, mock_get, mock_context):
+    @patch('sitemap_server._download', new_callable=AsyncMock)
+    async def test_parse_sitemap_recursive_index(
+        self, mock_download, mock_context, sample_sitemap_xml, sample_sitemap_index_xml
+    ):
+        """Test recursive mode merges child sitemap URLs and reports failures"""
+        async def download(url, feed, headers=None):
+            if url == "https://example.com/sitemap_index.xml":
+                return await _serve(sample_sitemap_index_xml.encode())(url, feed)
+            if url == "https://example.com/sitemap1.xml":
+                return await _serve(sample_sitemap_xml.encode())(url, feed)
+            raise httpx.HTTPError("HTTP 500")
+
+        mock_download.side_effect = download
+
+        result = await _parse_sitemap_internal(
+            "https://example.com/sitemap_index.xml", mock_context, recursive=True
+        )
+
+        assert result["success"] is True
+        assert result["sitemap_type"] == "sitemap_index"
+        assert result["urls"] == ["https://example.com/page1", "https://example.com/page2"]
+        assert result["total_urls"] == 2
+        assert result["child_sitemaps"] == 2
+        assert result["failed_sitemaps"] == [
+            {"url": "https://example.com/sitemap2.xml", "error": "HTTP 500"}
+        ]
+        assert result["nested_indexes"] == []
+        assert result["truncated"] is False
+
+    @pytest.mark.asyncio
+    @patch('sitemap_server._download', new_callable=AsyncMock)
+    async def test_parse_sitemap_recursive_skips_nested_index(
+        self, mock_download, mock_context, sample_sitemap_xml, sample_sitemap_index_xml
+    ):
+        """Test a child that is itself an index is reported, not merged as pages"""
+        nested_index = sample_sitemap_index_xml.replace("sitemap1.xml", "b.xml")
+
+        async def download(url, feed, headers=None):
+            if url == "https://example.com/sitemap_index.xml":
+                return await _serve(sample_sitemap_index_xml.encode())(url, feed)
+            if url == "https://example.com/sitemap1.xml":
+                return await _serve(sample_sitemap_xml.encode())(url, feed)
+            return await _serve(nested_index.encode())(url, feed)
+
+        mock_download.side_effect = download
+
+        result = await _parse_sitemap_internal(
+            "https://example.com/sitemap_index.xml", mock_context, recursive=True
+        )
+
+        assert result["urls"] == ["https://example.com/page1", "https://example.com/page2"]
+        assert result["nested_indexes"] == ["https://example.com/sitemap2.xml"]
+        assert result["failed_sitemaps"] == []
+        assert mock_download.call_count == 3
+
+    @pytest.mark.asyncio
+    @patch('sitemap_server._MAX_INDEX_CHILDREN', 1)
+    @patch('sitemap_server._download', new_callable=AsyncMock)
+    async def test_parse_sitemap_recursive_caps_children(
+        self, mock_download, mock_context, sample_sitemap_xml, sample_sitemap_index_xml
+    ):
+        """Test only the first _MAX_INDEX_CHILDREN children are fetched"""
+        async def download(url, feed, headers=None):
+            if url == "https://example.com/sitemap_index.xml":
+                return await _serve(sample_sitemap_index_xml.encode())(url, feed)
+            return await _serve(sample_sitemap_xml.encode())(url, feed)
+
+        mock_download.side_effect = download
+
+        result = await _parse_sitemap_internal(
+            "https://example.com/sitemap_index.xml", mock_context, recursive=True
+        )
+
+        assert mock_download.call_count == 2
+        assert result["child_sitemaps"] == 2
+        assert result["total_urls"] == 2
+        assert result["truncated"] is True
+
+    @pytest.mark.asyncio
+    @patch('sitemap_server._MAX_MERGED_URLS', 3)
+    @patch('sitemap_server._download', new_callable=AsyncMock)
+    async def test_parse_sitemap_recursive_caps_merged_urls(
+        self, mock_download, mock_context, sample_sitemap_xml, sample_sitemap_index_xml
+    ):
+        """Test merging stops at _MAX_MERGED_URLS and children stay out of the cache"""
+        async def download(url, feed, headers=None):
+            if url == "https://example.com/sitemap_index.xml":
+                return await _serve(sample_sitemap_index_xml.encode())(url, feed)
+            return await _serve(sample_sitemap_xml.encode())(url, feed)
+
+        mock_download.side_effect = download
+
+        result = await _parse_sitemap_internal(
+            "https://example.com/sitemap_index.xml", mock_context, recursive=True
+        )
+
+        assert result["urls"] == [
+            "https://example.com/page1",
+            "https://example.com/page2",
+            "https://example.com/page1"
+        ]
+        assert result["truncated"] is True
+        assert list(_SITEMAP_CACHE) == ["https://example.com/sitemap_index.xml"]
+
+    @pytest.mark.asyncio
+    @patch('sitemap_server._download', new_callable=AsyncMock)
+    async def test_parse_sitemap_recursive_slow_child_does_not_stall_others(
+        self, mock_download, mock_context, sample_sitemap_xml
+    ):
+        """Test later children keep being fetched while an early child is slow"""
+        index = _sitemap_index(32)
+        last_child_started = asyncio.Event()
+
+        async def download(url, feed, headers=None):
+            if url == "https://example.com/sitemap_index.xml":
+                return await _serve(index)(url, feed)
+            if url == "https://example.com/sitemap0.xml":
+                # Fixed batches of 16 would never reach child 31 while this waits
+                await asyncio.wait_for(last_child_started.wait(), timeout=1)
+            if url == "https://example.com/sitemap31.xml":
+                last_child_started.set()
+            return await _serve(sample_sitemap_xml.encode())(url, feed)
+
+        mock_download.side_effect = download
+
+        result = await _parse_sitemap_internal(
+            "https://example.com/sitemap_index.xml", mock_context, recursive=True
+        )
+
+        assert result["failed_sitemaps"] == []
+        assert result["total_urls"] == 64
+
+    @pytest.mark.asyncio
+    @patch('sitemap_server._MAX_MERGED_URLS', 2)
+    @patch('sitemap_server._download', new_callable=AsyncMock)
+    async def test_parse_sitemap_recursive_stop_cancels_pending_fetches(
+        self, mock_download, mock_context, sample_sitemap_xml
+    ):
+        """Test stopping at the URL cap leaves no child fetch running"""
+        index = _sitemap_index(40)
+
+        async def download(url, feed, headers=None):
+            if url == "https://example.com/sitemap_index.xml":
+                return await _serve(index)(url, feed)
+            # The cap is hit on the second child; the rest would hang if not cancelled
+            if url not in ("https://example.com/sitemap0.xml", "https://example.com/sitemap1.xml"):
+                await asyncio.sleep(10)
+            return await _serve(sample_sitemap_xml.encode())(url, feed)
+
+        mock_download.side_effect = download
+
+        result = await _parse_sitemap_internal(
+            "https://example.com/sitemap_index.xml", mock_context, recursive=True
+        )
+
+        assert result["total_urls"] == 2
+        assert result["truncated"] is True
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+
+    @pytest.mark.asyncio
+    @patch('sitemap_server._download', new_callable=AsyncMock)
+    async def test_parse_sitemap_index_not_expanded_by_default(
+        self, mock_download, mock_context, sample_sitemap_index_xml
+    ):
+        """Test a sitemap index lists its child sitemaps unless recursive is set"""
+        mock_download.side_effect = _serve(sample_sitemap_index_xml.encode())
+
+        result = await _parse_sitemap_internal("https://example.com/sitemap_index.xml", mock_context)
+
+        assert mock_download.call_count == 1
+        assert result["urls"] == ["https://example.com/sitemap1.xml", "https://example.com/sitemap2.xml"]
+        assert "failed_sitemaps" not in result
+
+    @pytest.mark.asyncio
+    @patch('sitemap_server._download', new_callable=AsyncMock)
+    async def test_parse_sitemap_network_error(self, mock_download, mock_context):
         """Test sitemap parsing with network error"""
-        mock_get.side_effect = Exception("Network error")
+        mock_download.side_effect = Exception("Network error")
 
         result = await _parse_sitemap_internal("https://example.com/sitemap.xml", mock_context)
 
@@ -130,11 +355,10 @@ class TestParseSitemapInternal:
         assert "解析错误" in result["error"]
 
     @pytest.mark.asyncio
-    @patch('sitemap_server.requests.get')
-    async def test_parse_sitemap_http_error(self, mock_get, mock_context):
+    @patch('sitemap_server._download', new_callable=AsyncMock)
+    async def test_parse_sitemap_http_error(self, mock_download, mock_context):
         """Test sitemap parsing with HTTP error"""
-        from requests import RequestException
-        mock_get.side_effect = RequestException("HTTP 404")
+        mock_download.side_effect = httpx.HTTPError("HTTP 404")
 
         result = await _parse_sitemap_internal("https://example.com/sitemap.xml", mock_context)
 
@@ -142,93 +366,346 @@ class TestParseSitemapInternal:
         assert "网络请求错误" in result["error"]
 
 
-class TestExtractUrlDetails:
-    """Test the _extract_url_details helper function"""
+def _sitemap_index(count):
+    """Build a sitemap index listing sitemap0.xml .. sitemap{count - 1}.xml"""
+    entries = "".join(
+        f"<sitemap><loc>https://example.com/sitemap{i}.xml</loc></sitemap>" for i in range(count)
+    )
+    return (
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        f"{entries}</sitemapindex>"
+    ).encode()
 
-    def test_extract_url_details_with_metadata(self):
-        """Test URL details extraction with full metadata"""
-        sitemap_data = {
-            "urlset": {
-                "url": [
-                    {
-                        "loc": "https://example.com/page1",
-                        "lastmod": "2024-01-01",
-                        "changefreq": "daily",
-                        "priority": "0.8"
-                    },
-                    {
-                        "loc": "https://example.com/page2",
-                        "lastmod": "2024-01-02",
-                        "changefreq": "weekly",
-                        "priority": "0.6"
-                    }
-                ]
-            }
-        }
 
-        url_details = _extract_url_details(sitemap_data)
-        assert len(url_details) == 2
-        
-        first_url = url_details[0]
-        assert first_url['loc'] == "https://example.com/page1"
-        assert first_url['lastmod'] == "2024-01-01"
-        assert first_url['changefreq'] == "daily"
-        assert first_url['priority'] == "0.8"
+def _mock_client(handler):
+    """Build an AsyncClient that answers every request with handler"""
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
 
-    def test_extract_url_details_partial_metadata(self):
-        """Test URL details extraction with partial metadata"""
-        sitemap_data = {
-            "urlset": {
-                "url": {
-                    "loc": "https://example.com/page1",
-                    "lastmod": "2024-01-01"
-                    # Missing changefreq and priority
-                }
-            }
+
+class TestDownload:
+    """Test the _download helper"""
+
+    @pytest.mark.asyncio
+    async def test_plain_body(self, sample_sitemap_xml):
+        """Test an uncompressed body is fed through unchanged"""
+        client = _mock_client(lambda request: httpx.Response(200, content=sample_sitemap_xml.encode()))
+
+        chunks = []
+        with patch('sitemap_server._HTTP', client):
+            size, _ = await _download("https://example.com/sitemap.xml", chunks.append)
+
+        assert b"".join(chunks) == sample_sitemap_xml.encode()
+        assert size == len(sample_sitemap_xml.encode())
+
+    @pytest.mark.asyncio
+    async def test_gzip_file_decompressed(self, sample_sitemap_xml):
+        """Test .xml.gz payloads without Content-Encoding are gunzipped"""
+        body = gzip.compress(sample_sitemap_xml.encode())
+        client = _mock_client(lambda request: httpx.Response(200, content=body))
+
+        chunks = []
+        with patch('sitemap_server._HTTP', client):
+            size, _ = await _download("https://example.com/sitemap.xml.gz", chunks.append)
+
+        assert b"".join(chunks) == sample_sitemap_xml.encode()
+        assert size == len(sample_sitemap_xml.encode())
+
+    @pytest.mark.asyncio
+    async def test_content_encoding_decoded(self, sample_sitemap_xml):
+        """Test gzip transfer encoding is decoded by the client"""
+        body = gzip.compress(sample_sitemap_xml.encode())
+        client = _mock_client(
+            lambda request: httpx.Response(200, content=body, headers={"Content-Encoding": "gzip"})
+        )
+
+        chunks = []
+        with patch('sitemap_server._HTTP', client):
+            size, _ = await _download("https://example.com/sitemap.xml", chunks.append)
+
+        assert b"".join(chunks) == sample_sitemap_xml.encode()
+        assert size == len(sample_sitemap_xml.encode())
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("compress", [False, True])
+    async def test_oversized_body_rejected(self, compress):
+        """Test bodies over the cap are refused, before and after gunzip"""
+        body = b"<urlset>" + b" " * 200 + b"</urlset>"
+        if compress:
+            body = gzip.compress(body)
+        client = _mock_client(lambda request: httpx.Response(200, content=body))
+
+        chunks = []
+        with patch('sitemap_server._HTTP', client), patch('sitemap_server._MAX_SITEMAP_BYTES', 100):
+            with pytest.raises(ValueError):
+                await _download("https://example.com/sitemap.xml", chunks.append)
+
+    @pytest.mark.asyncio
+    async def test_not_modified_returns_no_body(self):
+        """Test a 304 answer to a conditional request yields no body"""
+        def handler(request):
+            assert request.headers["If-None-Match"] == '"v1"'
+            return httpx.Response(304)
+
+        chunks = []
+        with patch('sitemap_server._HTTP', _mock_client(handler)):
+            size, _ = await _download(
+                "https://example.com/sitemap.xml", chunks.append, {"If-None-Match": '"v1"'}
+            )
+
+        assert size is None
+        assert chunks == []
+
+    @pytest.mark.asyncio
+    async def test_http_error_raised(self):
+        """Test error statuses surface as httpx errors"""
+        client = _mock_client(lambda request: httpx.Response(404))
+
+        chunks = []
+        with patch('sitemap_server._HTTP', client):
+            with pytest.raises(httpx.HTTPStatusError):
+                await _download("https://example.com/sitemap.xml", chunks.append)
+
+
+class TestFetchAndParse:
+    """Test the _fetch_and_parse cache"""
+
+    @pytest.mark.asyncio
+    @patch('sitemap_server._download', new_callable=AsyncMock)
+    async def test_second_fetch_uses_cache(self, mock_download, sample_sitemap_xml):
+        """Test repeated fetches of one URL hit the network once"""
+        mock_download.side_effect = _serve(sample_sitemap_xml.encode())
+
+        first = await _fetch_and_parse("https://example.com/sitemap.xml")
+        second = await _fetch_and_parse("https://example.com/sitemap.xml")
+
+        assert mock_download.call_count == 1
+        assert second is first
+        assert first.urls == ["https://example.com/page1", "https://example.com/page2"]
+        assert first.sitemap_type == "standard_sitemap"
+        assert first.content_size == len(sample_sitemap_xml.encode())
+
+    @pytest.mark.asyncio
+    @patch('sitemap_server._CACHE_MAX_URLS', 3)
+    @patch('sitemap_server._download', new_callable=AsyncMock)
+    async def test_oldest_entries_evicted_by_total_urls(self, mock_download, sample_sitemap_xml):
+        """Test the cache evicts the oldest documents once the URL budget is exceeded"""
+        mock_download.side_effect = _serve(sample_sitemap_xml.encode())
+
+        await _fetch_and_parse("https://example.com/a.xml")
+        await _fetch_and_parse("https://example.com/b.xml")
+
+        assert list(_SITEMAP_CACHE) == ["https://example.com/b.xml"]
+
+    @pytest.mark.asyncio
+    @patch('sitemap_server._CACHE_MAX_URLS', 1)
+    @patch('sitemap_server._download', new_callable=AsyncMock)
+    async def test_document_over_url_budget_not_cached(self, mock_download, sample_sitemap_xml):
+        """Test a document larger than the whole budget is returned but not cached"""
+        mock_download.side_effect = _serve(sample_sitemap_xml.encode())
+
+        document = await _fetch_and_parse("https://example.com/sitemap.xml")
+
+        assert len(document.urls) == 2
+        assert _SITEMAP_CACHE == {}
+
+    @pytest.mark.asyncio
+    @patch('sitemap_server.time.monotonic')
+    @patch('sitemap_server._download', new_callable=AsyncMock)
+    async def test_expired_entry_refetched(self, mock_download, mock_monotonic, sample_sitemap_xml):
+        """Test entries older than the TTL are fetched again"""
+        mock_download.side_effect = _serve(sample_sitemap_xml.encode())
+
+        mock_monotonic.return_value = 1000.0
+        await _fetch_and_parse("https://example.com/sitemap.xml")
+        mock_monotonic.return_value = 1000.0 + 601
+        await _fetch_and_parse("https://example.com/sitemap.xml")
+
+        assert mock_download.call_count == 2
+
+    @pytest.mark.asyncio
+    @patch('sitemap_server.time.monotonic')
+    @patch('sitemap_server._download', new_callable=AsyncMock)
+    async def test_expired_entry_revalidated(self, mock_download, mock_monotonic, sample_sitemap_xml):
+        """Test expired entries send validators and are reused on 304"""
+        validators = httpx.Headers({"ETag": '"v1"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"})
+        serve = _serve(sample_sitemap_xml.encode(), validators)
+
+        async def download(url, feed, headers=None):
+            if headers:
+                return None, httpx.Headers()  # 304 Not Modified
+            return await serve(url, feed)
+
+        mock_download.side_effect = download
+
+        mock_monotonic.return_value = 1000.0
+        first = await _fetch_and_parse("https://example.com/sitemap.xml")
+        mock_monotonic.return_value = 1000.0 + 601
+        second = await _fetch_and_parse("https://example.com/sitemap.xml")
+
+        assert second is first
+        assert mock_download.call_args.args[2] == {
+            "If-None-Match": '"v1"',
+            "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"
         }
 
-        url_details = _extract_url_details(sitemap_data)
-        assert len(url_details) == 1
-        
-        url_info = url_details[0]
-        assert url_info['loc'] == "https://example.com/page1"
-        assert url_info['lastmod'] == "2024-01-01"
-        assert url_info['changefreq'] is None
-        assert url_info['priority'] is None
+        # The revalidated entry is fresh again
+        mock_monotonic.return_value = 1000.0 + 900
+        await _fetch_and_parse("https://example.com/sitemap.xml")
+        assert mock_download.call_count == 2
+
+    @pytest.mark.asyncio
+    @patch('sitemap_server._download', new_callable=AsyncMock)
+    async def test_restart_revalidates_from_disk(self, mock_download, sample_sitemap_xml):
+        """Test a document saved to disk is revalidated after the memory cache is lost"""
+        validators = httpx.Headers({"ETag": '"v1"'})
+        serve = _serve(sample_sitemap_xml.encode(), validators)
+
+        async def download(url, feed, headers=None):
+            if headers:
+                return None, httpx.Headers()  # 304 Not Modified
+            return await serve(url, feed)
+
+        mock_download.side_effect = download
+
+        first = await _fetch_and_parse("https://example.com/sitemap.xml")
+        _SITEMAP_CACHE.clear()  # A new server process starts with an empty cache
+        second = await _fetch_and_parse("https://example.com/sitemap.xml")
+
+        assert mock_download.call_args.args[2] == {"If-None-Match": '"v1"'}
+        assert second.url_details == first.url_details
+        assert second.sitemap_type == first.sitemap_type
+        assert second.etag == '"v1"'
+        assert "https://example.com/sitemap.xml" in _SITEMAP_CACHE
+
+    @pytest.mark.asyncio
+    @patch('sitemap_server._download', new_callable=AsyncMock)
+    async def test_disk_entry_needs_validators(self, mock_download, sample_sitemap_xml):
+        """Test documents without ETag or Last-Modified are not saved to disk"""
+        mock_download.side_effect = _serve(sample_sitemap_xml.encode())
+
+        await _fetch_and_parse("https://example.com/sitemap.xml")
+
+        assert not os.path.exists(_disk_cache_path("https://example.com/sitemap.xml"))
+
+    @pytest.mark.asyncio
+    @patch('sitemap_server._download', new_callable=AsyncMock)
+    async def test_corrupt_disk_entry_ignored(self, mock_download, sample_sitemap_xml):
+        """Test an unreadable disk entry falls back to a plain download"""
+        path = _disk_cache_path("https://example.com/sitemap.xml")
+        os.makedirs(os.path.dirname(path))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("{not json")
+        mock_download.side_effect = _serve(sample_sitemap_xml.encode())
+
+        document = await _fetch_and_parse("https://example.com/sitemap.xml")
+
+        assert mock_download.call_args.args[2] == {}
+        assert len(document.urls) == 2
+
+    @pytest.mark.asyncio
+    @patch('sitemap_server._download', new_callable=AsyncMock)
+    async def test_disk_cache_prunes_oldest_entries(self, mock_download, sample_sitemap_xml):
+        """Test the oldest disk entries are removed once the size limit is exceeded"""
+        mock_download.side_effect = _serve(sample_sitemap_xml.encode(), {"ETag": '"v1"'})
+
+        await _fetch_and_parse("https://example.com/a.xml")
+        first_path = _disk_cache_path("https://example.com/a.xml")
+        os.utime(first_path, (0, 0))
+        with patch('sitemap_server._DISK_CACHE_MAX_BYTES', os.path.getsize(first_path) + 10):
+            await _fetch_and_parse("https://example.com/b.xml")
+
+        assert not os.path.exists(first_path)
+        assert os.path.exists(_disk_cache_path("https://example.com/b.xml"))
+
+    @pytest.mark.asyncio
+    async def test_gzip_sitemap_matches_plain(self, sample_sitemap_xml):
+        """Test a .xml.gz sitemap parses to the same document as the plain one"""
+        body = sample_sitemap_xml.encode()
+
+        def handler(request):
+            if request.url.path.endswith(".gz"):
+                return httpx.Response(200, content=gzip.compress(body))
+            return httpx.Response(200, content=body)
+
+        with patch('sitemap_server._HTTP', _mock_client(handler)):
+            plain = await _fetch_and_parse("https://example.com/sitemap.xml")
+            gzipped = await _fetch_and_parse("https://example.com/sitemap.xml.gz")
+
+        assert gzipped.url_details == plain.url_details
+        assert gzipped.sitemap_type == plain.sitemap_type
+        assert gzipped.content_size == len(body)
+
+    @pytest.mark.asyncio
+    @patch('sitemap_server._download', new_callable=AsyncMock)
+    async def test_errors_not_cached(self, mock_download, sample_sitemap_xml):
+        """Test failed fetches are retried on the next call"""
+        mock_download.side_effect = Exception("Network error")
+        with pytest.raises(Exception, match="Network error"):
+            await _fetch_and_parse("https://example.com/sitemap.xml")
+
+        mock_download.side_effect = _serve(sample_sitemap_xml.encode())
+
+        assert (await _fetch_and_parse("https://example.com/sitemap.xml")).urls
+
+
+class TestParseLastmod:
+    """Test the cached _parse_lastmod helper"""
+
+    def test_parse_date_only(self):
+        """Test plain YYYY-MM-DD values"""
+        assert _parse_lastmod("2024-01-01") == datetime(2024, 1, 1)
+
+    def test_parse_timezone_normalised_to_naive_utc(self):
+        """Test aware timestamps become comparable naive UTC datetimes"""
+        assert _parse_lastmod("2024-01-01T00:00:00Z") == datetime(2024, 1, 1)
+        assert _parse_lastmod("2024-01-01T08:00:00+08:00") == datetime(2024, 1, 1)
+
+    def test_parse_invalid_returns_none(self):
+        """Test unrecognised values parse to None instead of raising"""
+        assert _parse_lastmod("not-a-date") is None
+        assert _parse_lastmod("2024/01/01") is None
+
+    def test_extraction_stores_parsed_lastmod(self, sample_sitemap_xml):
+        """Test the parser attaches lastmod_dt to each entry"""
+        _, url_details = _parse_sitemap_xml(sample_sitemap_xml.encode())
+
+        assert url_details[0].lastmod_dt == datetime(2024, 1, 1)
 
 
 class TestAnalyzeUpdatePatterns:
-    """Test the _analyze_update_patterns helper function"""
+    """Test the update_patterns section of _compute_update_report"""
 
     def test_analyze_update_patterns_with_data(self):
         """Test update pattern analysis with sample data"""
         url_details = [
-            {
-                'loc': 'https://example.com/page1',
-                'lastmod': '2024-01-01',
-                'changefreq': 'daily',
-                'priority': '0.8'
-            },
-            {
-                'loc': 'https://example.com/page2',
-                'lastmod': '2024-01-02',
-                'changefreq': 'weekly',
-                'priority': '0.6'
-            },
-            {
-                'loc': 'https://example.com/page3',
-                'lastmod': '2024-01-03',
-                'changefreq': 'daily',
-                'priority': '0.7'
-            }
+            _UrlRecord(
+                loc='https://example.com/page1',
+                lastmod='2024-01-01',
+                lastmod_dt=datetime(2024, 1, 1),
+                changefreq='daily',
+                priority='0.8'
+            ),
+            _UrlRecord(
+                loc='https://example.com/page2',
+                lastmod='2024-01-02',
+                lastmod_dt=datetime(2024, 1, 2),
+                changefreq='weekly',
+                priority='0.6'
+            ),
+            _UrlRecord(
+                loc='https://example.com/page3',
+                lastmod='2024-01-03',
+                lastmod_dt=datetime(2024, 1, 3),
+                changefreq='daily',
+                priority='0.7'
+            )
         ]
 
         with patch('sitemap_server.datetime') as mock_datetime:
-            from datetime import datetime
             mock_datetime.now.return_value = datetime(2024, 1, 10)
             mock_datetime.strptime = datetime.strptime
             
-            result = _analyze_update_patterns(url_details)
+            result = _compute_update_report(url_details)['update_patterns']
 
         assert 'changefreq_distribution' in result
         assert 'priority_distribution' in result
@@ -240,12 +717,36 @@ class TestAnalyzeUpdatePatterns:
         
         # Check lastmod analysis
         assert result['lastmod_analysis']['total_with_lastmod'] == 3
+        assert result['lastmod_analysis']['recent_updates_7d'] == 1
+        assert result['lastmod_analysis']['recent_updates_30d'] == 3
+
+    def test_recency_windows_use_utc_now(self):
+        """Test recency is measured from UTC now, not the server's local time"""
+        url_details = [
+            _UrlRecord(
+                loc='https://example.com/page1',
+                lastmod='2024-01-02T05:00:00Z',
+                lastmod_dt=datetime(2024, 1, 2, 5)
+            )
+        ]
+
+        def now(tz=None):
+            # A server at UTC+9: local time runs 9 hours ahead of UTC
+            utc_now = datetime(2024, 1, 10, tzinfo=timezone.utc)
+            return utc_now.astimezone(tz) if tz else datetime(2024, 1, 10, 9)
+
+        with patch('sitemap_server.datetime') as mock_datetime:
+            mock_datetime.now.side_effect = now
+
+            result = _compute_update_report(url_details)['update_patterns']
+
+        assert result['lastmod_analysis']['recent_updates_7d'] == 1
 
     def test_analyze_update_patterns_empty_data(self):
         """Test update pattern analysis with empty data"""
         url_details = []
         
-        result = _analyze_update_patterns(url_details)
+        result = _compute_update_report(url_details)['update_patterns']
         
         assert result['changefreq_distribution'] == {}
         assert result['priority_distribution'] == {}
@@ -253,32 +754,35 @@ class TestAnalyzeUpdatePatterns:
 
 
 class TestGetRecentUpdates:
-    """Test the _get_recent_updates helper function"""
+    """Test the recent_updates section of _compute_update_report"""
 
     def test_get_recent_updates_sorted(self):
         """Test recent updates are sorted correctly"""
         url_details = [
-            {
-                'loc': 'https://example.com/page1',
-                'lastmod': '2024-01-01',
-                'changefreq': 'daily',
-                'priority': '0.8'
-            },
-            {
-                'loc': 'https://example.com/page2',
-                'lastmod': '2024-01-03',  # Most recent
-                'changefreq': 'weekly',
-                'priority': '0.6'
-            },
-            {
-                'loc': 'https://example.com/page3',
-                'lastmod': '2024-01-02',  # Middle
-                'changefreq': 'daily',
-                'priority': '0.7'
-            }
+            _UrlRecord(
+                loc='https://example.com/page1',
+                lastmod='2024-01-01',
+                lastmod_dt=datetime(2024, 1, 1),
+                changefreq='daily',
+                priority='0.8'
+            ),
+            _UrlRecord(
+                loc='https://example.com/page2',
+                lastmod='2024-01-03',
+                lastmod_dt=datetime(2024, 1, 3),  # Most recent
+                changefreq='weekly',
+                priority='0.6'
+            ),
+            _UrlRecord(
+                loc='https://example.com/page3',
+                lastmod='2024-01-02',
+                lastmod_dt=datetime(2024, 1, 2),  # Middle
+                changefreq='daily',
+                priority='0.7'
+            )
         ]
         
-        recent_updates = _get_recent_updates(url_details, limit=10)
+        recent_updates = _compute_update_report(url_details, recent_limit=10)['recent_updates']
         
         assert len(recent_updates) == 3
         # Should be sorted by lastmod date, most recent first
@@ -289,11 +793,15 @@ class TestGetRecentUpdates:
     def test_get_recent_updates_limit(self):
         """Test recent updates respects limit"""
         url_details = [
-            {'loc': f'https://example.com/page{i}', 'lastmod': f'2024-01-{i:02d}'}
+            _UrlRecord(
+                loc=f'https://example.com/page{i}',
+                lastmod=f'2024-01-{i:02d}',
+                lastmod_dt=datetime(2024, 1, i)
+            )
             for i in range(1, 6)  # 5 URLs
         ]
         
-        recent_updates = _get_recent_updates(url_details, limit=3)
+        recent_updates = _compute_update_report(url_details, recent_limit=3)['recent_updates']
         
         assert len(recent_updates) == 3
         # Should get the 3 most recent
@@ -301,20 +809,82 @@ class TestGetRecentUpdates:
         assert recent_updates[1]['url'] == 'https://example.com/page4'
         assert recent_updates[2]['url'] == 'https://example.com/page3'
 
+    def test_get_recent_updates_ties_keep_document_order(self):
+        """Test entries sharing a lastmod keep their sitemap order"""
+        url_details = [
+            _UrlRecord(loc=f'https://example.com/page{i}', lastmod='2024-01-01', lastmod_dt=datetime(2024, 1, 1))
+            for i in range(1, 6)
+        ]
+
+        recent_updates = _compute_update_report(url_details, recent_limit=3)['recent_updates']
+
+        assert [item['url'] for item in recent_updates] == [
+            'https://example.com/page1',
+            'https://example.com/page2',
+            'https://example.com/page3'
+        ]
+
     def test_get_recent_updates_no_lastmod(self):
         """Test recent updates with URLs missing lastmod"""
         url_details = [
-            {'loc': 'https://example.com/page1'},  # No lastmod
-            {'loc': 'https://example.com/page2', 'lastmod': '2024-01-01'},
-            {'loc': 'https://example.com/page3'}   # No lastmod
+            _UrlRecord(loc='https://example.com/page1'),  # No lastmod
+            _UrlRecord(loc='https://example.com/page2', lastmod='2024-01-01', lastmod_dt=datetime(2024, 1, 1)),
+            _UrlRecord(loc='https://example.com/page3')   # No lastmod
         ]
         
-        recent_updates = _get_recent_updates(url_details, limit=10)
+        recent_updates = _compute_update_report(url_details, recent_limit=10)['recent_updates']
         
         # Should only include URLs with lastmod
         assert len(recent_updates) == 1
         assert recent_updates[0]['url'] == 'https://example.com/page2'
 
 
+
+class TestComputeUpdateReport:
+    """Test the coverage and domain sections of _compute_update_report"""
+
+    def test_metadata_coverage_and_domain_summary(self):
+        """Test coverage counters and per-domain aggregation from one pass"""
+        url_details = [
+            _UrlRecord(
+                loc='https://example.com/a',
+                lastmod='2024-01-01',
+                lastmod_dt=datetime(2024, 1, 1),
+                changefreq='daily',
+                priority='0.8'
+            ),
+            _UrlRecord(
+                loc='https://example.com/b',
+                lastmod='2024-01-05',
+                lastmod_dt=datetime(2024, 1, 5),
+                changefreq=None,
+                priority='0.4'
+            ),
+            _UrlRecord(
+                loc='https://other.com/',
+                lastmod='garbage',
+                lastmod_dt=None,
+                changefreq='weekly',
+                priority=None
+            ),
+            _UrlRecord(loc='https://nodate.com/', changefreq='monthly', priority='0.5')
+        ]
+
+        report = _compute_update_report(url_details)
+
+        assert report['metadata_coverage'] == {
+            'urls_with_lastmod': 3,
+            'urls_with_changefreq': 3,
+            'urls_with_priority': 3
+        }
+        domains = report['domain_update_summary']
+        assert list(domains) == ['example.com', 'other.com']
+        assert domains['example.com']['count'] == 2
+        assert domains['example.com']['latest_update'] == datetime(2024, 1, 5)
+        assert domains['example.com']['avg_priority'] == pytest.approx(0.6)
+        assert domains['other.com']['latest_update'] is None
+        assert domains['other.com']['avg_priority'] is None
+
+
 # Note: MCP tool tests are skipped due to FastMCP decorator complexity
 # The core functionality is tested through the internal functions above